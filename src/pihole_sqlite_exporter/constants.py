@@ -1,4 +1,4 @@
-BLOCKED_STATUSES = {1, 4, 5, 6, 7, 8, 9, 10, 11, 15}
+BLOCKED_STATUSES = frozenset({1, 4, 5, 6, 7, 8, 9, 10, 11, 15})
 
 QUERY_TYPE_MAP = {
     1: "A",
@@ -6,14 +6,24 @@ from urllib.parse import quote
 logger = logging.getLogger("pihole_sqlite_exporter")
 T = TypeVar("T")
 
+CONNECTION_PRAGMAS = (
+    "PRAGMA mmap_size=268435456;",
+    "PRAGMA cache_size=-65536;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA query_only=1;",
+)
 
-def sqlite_ro(db_path: str) -> sqlite3.Connection:
+
+def sqlite_ro(db_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
     if db_path.startswith("file:"):
         dsn = db_path
     else:
         dsn = f"file:{quote(db_path, safe='/')}?mode=ro"
     logger.debug("Opening SQLite DB read-only: %s", db_path)
-    return sqlite3.connect(dsn, uri=True)
+    conn = sqlite3.connect(dsn, uri=True, check_same_thread=check_same_thread)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
 
 
 def fetch_scalar(cur: sqlite3.Cursor, sql: str, params=(), default: T | None = None) -> T | None:
@@ -1,6 +1,7 @@
 import argparse
 import logging
 import os
+import threading
 import time
 from pathlib import Path
 
@@ -92,28 +93,39 @@ def main():
     else:
         logger.info("Exporter version=%s commit=%s", version, commit)
 
-        logger.info(
-            (
-                "Starting exporter (listen=%s:%s, tz=%s, ftl_db=%s, gravity_db=%s, top_n=%s, "
-                "lifetime_dest_counters=%s, lifetime_dest_cache_seconds=%s, scrape_interval=%s)"
-            ),
-            scraper.SETTINGS.listen_addr,
-            scraper.SETTINGS.listen_port,
-            scraper.SETTINGS.exporter_tz,
-            scraper.SETTINGS.ftl_db_path,
-            scraper.SETTINGS.gravity_db_path,
-            scraper.SETTINGS.top_n,
-            scraper.SETTINGS.enable_lifetime_dest_counters,
-            scraper.SETTINGS.lifetime_dest_cache_seconds,
-            scraper.SETTINGS.scrape_interval,
-        )
+    if scraper.SETTINGS.listen_socket_path:
+        listen = f"unix:{scraper.SETTINGS.listen_socket_path}"
+    else:
+        listen = f"{scraper.SETTINGS.listen_addr}:{scraper.SETTINGS.listen_port}"
+    logger.info(
+        (
+            "Starting exporter (listen=%s, tz=%s, ftl_db=%s, gravity_db=%s, top_n=%s, "
+            "lifetime_dest_counters=%s, lifetime_dest_cache_seconds=%s, scrape_interval=%s, "
+            "manage_indexes=%s)"
+        ),
+        listen,
+        scraper.SETTINGS.exporter_tz,
+        scraper.SETTINGS.ftl_db_path,
+        scraper.SETTINGS.gravity_db_path,
+        scraper.SETTINGS.top_n,
+        scraper.SETTINGS.enable_lifetime_dest_counters,
+        scraper.SETTINGS.lifetime_dest_cache_seconds,
+        scraper.SETTINGS.scrape_interval,
+        scraper.SETTINGS.manage_indexes,
+    )
+
+    if scraper.SETTINGS.manage_indexes:
+        scraper.ensure_query_indexes()
 
     try:
         scrape_and_update()
     except Exception:
         logger.exception("Initial scrape failed")
 
-    scraper.start_background_scrape(initial_delay=scraper.SETTINGS.scrape_interval)
+    stop_event = threading.Event()
+    scraper.start_background_scrape(
+        initial_delay=scraper.SETTINGS.scrape_interval, stop_event=stop_event
+    )
 
     handler = http_server.make_handler(
         metrics.METRICS.get_snapshot,
@@ -121,7 +133,15 @@ def main():
         _ready_status,
         logger,
     )
-    http_server.serve(scraper.SETTINGS.listen_addr, scraper.SETTINGS.listen_port, handler)
+    try:
+        if scraper.SETTINGS.listen_socket_path:
+            http_server.serve_unix(scraper.SETTINGS.listen_socket_path, handler)
+        else:
+            http_server.serve(scraper.SETTINGS.listen_addr, scraper.SETTINGS.listen_port, handler)
+    finally:
+        # The server only returns on shutdown (e.g. KeyboardInterrupt); wake the scrape
+        # loop so it exits instead of sleeping out its interval.
+        stop_event.set()
 
 
 if __name__ == "__main__":
@@ -1,80 +1,204 @@
+import functools
 import logging
+import os
+import socket
+import socketserver
+import stat
 import time
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from email.utils import formatdate
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from prometheus_client import CONTENT_TYPE_LATEST
 
+TEXT_PLAIN = "text/plain; charset=utf-8"
+
+
+@functools.lru_cache(maxsize=16)
+def _response_head(
+    protocol_version: str,
+    status: int,
+    content_type: str,
+    content_encoding: str = "",
+    vary: str = "",
+) -> bytes:
+    """Status line and the fixed headers; ETag, Content-Length and Date are added per response."""
+    encoding = f"Content-Encoding: {content_encoding}\r\n" if content_encoding else ""
+    vary_header = f"Vary: {vary}\r\n" if vary else ""
+    return (
+        f"{protocol_version} {status} {HTTPStatus(status).phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"{encoding}"
+        f"{vary_header}"
+    ).encode("latin-1")
+
+
+def _text_response(protocol_version: str, status: int, message: str) -> tuple[bytes, bytes]:
+    """Headers up to Content-Length, and the body; the Date header goes in between."""
+    body = message.encode()
+    head = _response_head(protocol_version, status, TEXT_PLAIN)
+    return b"%sContent-Length: %d\r\n" % (head, len(body)), body
+
+
+@functools.lru_cache(maxsize=1)
+def _date_header(second: int) -> bytes:
+    return b"Date: %s\r\n" % formatdate(second, usegmt=True).encode("latin-1")
+
+
+def _date() -> bytes:
+    # Formatted once per second rather than per response.
+    return _date_header(int(time.time()))
+
+
+@functools.lru_cache(maxsize=64)
+def _accepts_gzip(accept_encoding: str) -> bool:
+    # Each client sends the same header on every poll, so distinct values are parsed once.
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0))) > 0
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so a W/ prefix from a proxy still matches.
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+
+
+# Only constant bodies are prebuilt; probe messages can embed values such as the snapshot
+# age, so those responses are assembled per request.
+_NOT_FOUND_RESPONSE = _text_response(BaseHTTPRequestHandler.protocol_version, 404, "")
+_SNAPSHOT_UNAVAILABLE_RESPONSE = _text_response(
+    BaseHTTPRequestHandler.protocol_version, 503, "metrics snapshot unavailable\n"
+)
+
 
 def make_handler(get_snapshot, get_health, get_ready, logger=None):
     if logger is None:
         logger = logging.getLogger("pihole_sqlite_exporter")
 
     class Handler(BaseHTTPRequestHandler):
-        def do_GET(self):
-            if self.path not in ("/metrics", "/", "/healthz", "/readyz"):
-                self.send_response(404)
-                self.end_headers()
-                return
-
-            if self.path in ("/healthz", "/readyz"):
-                client_ip, client_port = self.client_address
-                user_agent = self.headers.get("User-Agent", "-")
+        def _client(self) -> str:
+            if isinstance(self.client_address, tuple):
+                return f"{self.client_address[0]}:{self.client_address[1]}"
+            return "unix"
+
+        def _respond(
+            self,
+            status: int,
+            content_type: str,
+            body: bytes,
+            content_encoding: str = "",
+            etag: str = "",
+            vary: str = "",
+        ) -> None:
+            # Status line, headers and body go out in one write instead of one per header.
+            head = _response_head(
+                self.protocol_version, status, content_type, content_encoding, vary
+            )
+            etag_header = b"ETag: %s\r\n" % etag.encode("latin-1") if etag else b""
+            self.wfile.write(
+                b"%s%sContent-Length: %d\r\n%s\r\n%s"
+                % (head, etag_header, len(body), _date(), body)
+            )
+
+        def _respond_not_modified(self, etag: str) -> None:
+            self.wfile.write(
+                b"%s 304 Not Modified\r\nVary: Accept-Encoding\r\nETag: %s\r\n%s\r\n"
+                % (self.protocol_version.encode("latin-1"), etag.encode("latin-1"), _date())
+            )
+
+        def _write_text(self, response: tuple[bytes, bytes]) -> None:
+            head, body = response
+            self.wfile.write(b"%s%s\r\n%s" % (head, _date(), body))
+
+        def _respond_text(self, status: int, message: str) -> None:
+            self._write_text(_text_response(self.protocol_version, status, message))
+
+        def _serve_not_found(self) -> None:
+            self._write_text(_NOT_FOUND_RESPONSE)
+
+        def _serve_probe(self, probe) -> None:
+            if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(
-                    "Health request from %s:%s user_agent=%s path=%s",
-                    client_ip,
-                    client_port,
-                    user_agent,
+                    "Health request from %s user_agent=%s path=%s",
+                    self._client(),
+                    self.headers.get("User-Agent", "-"),
                     self.path,
                 )
-                ok, msg = get_health() if self.path == "/healthz" else get_ready()
-                status = 200 if ok else 503
-                payload = msg.encode()
-                self.send_response(status)
-                self.send_header("Content-Type", "text/plain; charset=utf-8")
-                self.send_header("Content-Length", str(len(payload)))
-                self.end_headers()
-                self.wfile.write(payload)
-                return
+            ok, msg = probe()
+            self._respond_text(200 if ok else 503, msg)
+
+        def _serve_health(self) -> None:
+            self._serve_probe(get_health)
 
+        def _serve_ready(self) -> None:
+            self._serve_probe(get_ready)
+
+        def _serve_metrics(self) -> None:
+            debug = logger.isEnabledFor(logging.DEBUG)
             try:
-                client_ip, client_port = self.client_address
-                user_agent = self.headers.get("User-Agent", "-")
-                logger.debug(
-                    "Metrics request from %s:%s user_agent=%s", client_ip, client_port, user_agent
-                )
-                logger.debug("HTTP request: %s %s", self.command, self.path)
-                start = time.time()
+                if debug:
+                    logger.debug(
+                        "Metrics request from %s user_agent=%s path=%s",
+                        self._client(),
+                        self.headers.get("User-Agent", "-"),
+                        self.path,
+                    )
+                    start_ns = time.monotonic_ns()
                 snapshot = get_snapshot()
                 payload = snapshot.payload
                 if not payload:
-                    msg = b"metrics snapshot unavailable\n"
-                    self.send_response(503)
-                    self.send_header("Content-Type", "text/plain; charset=utf-8")
-                    self.send_header("Content-Length", str(len(msg)))
-                    self.end_headers()
-                    self.wfile.write(msg)
+                    self._write_text(_SNAPSHOT_UNAVAILABLE_RESPONSE)
                     return
-                self.send_response(200)
-                self.send_header("Content-Type", CONTENT_TYPE_LATEST)
-                self.send_header("Content-Length", str(len(payload)))
-                self.end_headers()
-                self.wfile.write(payload)
-                elapsed = time.time() - start
-                logger.debug(
-                    "HTTP 200 served metrics bytes=%d scrape_time=%.3fs",
-                    len(payload),
-                    elapsed,
-                )
+                encoding = ""
+                etag = snapshot.etag
+                if snapshot.payload_gzip and _accepts_gzip(self.headers.get("Accept-Encoding", "")):
+                    payload = snapshot.payload_gzip
+                    encoding = "gzip"
+                    # Each representation needs its own strong validator.
+                    etag = snapshot.etag_gzip
+                # Pollers that already hold this snapshot get a bodyless 304.
+                status = 200
+                if etag and _etag_matches(self.headers.get("If-None-Match", ""), etag):
+                    status = 304
+                    payload = b""
+                    self._respond_not_modified(etag)
+                else:
+                    # The body depends on Accept-Encoding, so shared caches must key on it.
+                    self._respond(
+                        status, CONTENT_TYPE_LATEST, payload, encoding, etag, "Accept-Encoding"
+                    )
+                if debug:
+                    logger.debug(
+                        "HTTP %d served metrics bytes=%d elapsed=%.3fms",
+                        status,
+                        len(payload),
+                        (time.monotonic_ns() - start_ns) / 1e6,
+                    )
             except (BrokenPipeError, ConnectionResetError) as e:
                 logger.debug("Client disconnected while serving request: %s", e)
             except Exception as e:
                 logger.exception("Scrape failed while serving request")
-                msg = f"scrape failed: {e}\n".encode()
-                self.send_response(500)
-                self.send_header("Content-Type", "text/plain; charset=utf-8")
-                self.send_header("Content-Length", str(len(msg)))
-                self.end_headers()
-                self.wfile.write(msg)
+                self._respond(500, TEXT_PLAIN, f"scrape failed: {e}\n".encode())
+
+        routes = {
+            "/metrics": _serve_metrics,
+            "/": _serve_metrics,
+            "/healthz": _serve_health,
+            "/readyz": _serve_ready,
+        }
+
+        def do_GET(self):
+            self.routes.get(self.path, Handler._serve_not_found)(self)
 
         def log_message(self, format, *args):
             return
@@ -82,7 +206,46 @@ def make_handler(get_snapshot, get_health, get_ready, logger=None):
     return Handler
 
 
+class TCPHTTPServer(ThreadingHTTPServer):
+    """Thread-per-request server so a slow client cannot stall health checks."""
+
+    def get_request(self):
+        conn, addr = super().get_request()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, addr
+
+
 def serve(listen_addr: str, listen_port: int, handler_cls) -> None:
-    httpd = HTTPServer((listen_addr, listen_port), handler_cls)
+    httpd = TCPHTTPServer((listen_addr, listen_port), handler_cls)
     logging.getLogger("pihole_sqlite_exporter").info("HTTP server ready; waiting for scrapes")
     httpd.serve_forever()
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self) -> None:
+        path = self.server_address
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+        # The socket file takes its mode from the umask at bind(); restrict it first so
+        # it is never world-connectable, even before the chmod.
+        old_umask = os.umask(0o117)
+        try:
+            socketserver.TCPServer.server_bind(self)
+        finally:
+            os.umask(old_umask)
+        os.chmod(path, 0o660)
+        self.server_name = path
+        self.server_port = 0
+
+
+def serve_unix(socket_path: str, handler_cls) -> None:
+    httpd = UnixHTTPServer(socket_path, handler_cls)
+    logging.getLogger("pihole_sqlite_exporter").info(
+        "HTTP server ready on unix socket %s; waiting for scrapes", socket_path
+    )
+    httpd.serve_forever()
@@ -1,17 +1,61 @@
-import threading
+import gzip
 import time
 from dataclasses import dataclass
 
-from prometheus_client import CollectorRegistry, Gauge
+from prometheus_client import CollectorRegistry, Counter, Gauge
 from prometheus_client.core import CounterMetricFamily
+from prometheus_client.samples import Sample
+from prometheus_client.utils import floatToGoString
 
 from .metrics_state import MetricsState
 
 
-@dataclass(frozen=True)
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _header(name: str, doc: str, type_: str) -> bytes:
+    doc = doc.replace("\\", r"\\").replace("\n", r"\n")
+    return f"# HELP {name} {doc}\n# TYPE {name} {type_}\n".encode()
+
+
+def _family_headers(family) -> tuple[bytes, bytes]:
+    """Headers for a family's own block and for its ``_created`` block.
+
+    Counters are exposed as ``<name>_total``; like ``generate_latest``, their ``_created``
+    samples go into a separate gauge block instead of under the counter's TYPE.
+    """
+    name = family.name + "_total" if family.type == "counter" else family.name
+    return (
+        _header(name, family.documentation, family.type),
+        _header(family.name + "_created", family.documentation, "gauge"),
+    )
+
+
+def _sample_line(sample) -> bytes:
+    value = floatToGoString(sample.value)
+    if sample.labels:
+        labels = ",".join(
+            f'{k}="{_escape_label_value(v)}"' for k, v in sorted(sample.labels.items())
+        )
+        return f"{sample.name}{{{labels}}} {value}\n".encode()
+    return f"{sample.name} {value}\n".encode()
+
+
+def _counter_sample(family: CounterMetricFamily, labels: dict[str, str], value: float) -> Sample:
+    return Sample(family.name + "_total", labels, float(value))
+
+
+@dataclass(frozen=True, slots=True)
 class MetricsSnapshot:
     payload: bytes
     timestamp: float
+    payload_gzip: bytes = b""
+    etag: str = ""
+
+    @property
+    def etag_gzip(self) -> str:
+        return f'{self.etag[:-1]}-gzip"' if self.etag else ""
 
 
 class Metrics:
@@ -19,66 +63,67 @@ class Metrics:
         self.hostname_label = hostname_label
         self.registry = CollectorRegistry()
         self.state = MetricsState()
-        self._forward_destinations_lifetime: dict[str, int] = {}
-        self._snapshot_lock = threading.Lock()
+        self._forward_destinations_lifetime: list[tuple[str, int]] = []
+        self._forward_destinations_samples: list[Sample] = []
+        # Snapshot and scrape status are immutable values replaced by a single reference
+        # assignment, so readers never need a lock and never see a half-updated state.
         self._snapshot = MetricsSnapshot(payload=b"", timestamp=0.0)
-        self._scrape_status_lock = threading.Lock()
-        self._last_scrape_success = 0
-        self._last_scrape_timestamp = 0.0
-        self._last_successful_scrape_timestamp = 0.0
+        self._scrape_status: tuple[int, float, float] = (0, 0.0, 0.0)
+
+        self._total_queries_family = CounterMetricFamily(
+            "pihole_dns_queries_total",
+            (
+                "Total number of DNS queries (lifetime, monotonic) as reported by "
+                "Pi-hole FTL counters table"
+            ),
+            labels=["hostname"],
+        )
+        self._blocked_queries_family = CounterMetricFamily(
+            "pihole_dns_queries_blocked_total",
+            (
+                "Total number of blocked queries (lifetime, monotonic) as reported by "
+                "Pi-hole FTL counters table"
+            ),
+            labels=["hostname"],
+        )
+        self._forward_destinations_family = CounterMetricFamily(
+            "pihole_forward_destinations_total",
+            (
+                "Total number of forward destinations requests made by Pi-hole by "
+                "destination (lifetime, derived from queries table)"
+            ),
+            labels=["hostname", "destination", "destination_name"],
+        )
 
         metrics_ref = self
 
-        class PiholeTotalsCollector:
+        class PiholeLifetimeCollector:
             def collect(inner_self):
+                # The families are built once; only their samples are replaced per collect.
                 host = metrics_ref.hostname_label
-
-                total_queries_metric = CounterMetricFamily(
-                    "pihole_dns_queries_total",
-                    (
-                        "Total number of DNS queries (lifetime, monotonic) as reported by "
-                        "Pi-hole FTL counters table"
-                    ),
-                    labels=["hostname"],
-                )
-                total_queries_metric.add_metric(
-                    [host], float(metrics_ref.state.total_queries_lifetime)
-                )
+                state = metrics_ref.state
+
+                total_queries_metric = metrics_ref._total_queries_family
+                total_queries_metric.samples = [
+                    _counter_sample(
+                        total_queries_metric, {"hostname": host}, state.total_queries_lifetime
+                    )
+                ]
                 yield total_queries_metric
 
-                blocked_queries_metric = CounterMetricFamily(
-                    "pihole_dns_queries_blocked_total",
-                    (
-                        "Total number of blocked queries (lifetime, monotonic) as reported by "
-                        "Pi-hole FTL counters table"
-                    ),
-                    labels=["hostname"],
-                )
-                blocked_queries_metric.add_metric(
-                    [host], float(metrics_ref.state.blocked_queries_lifetime)
-                )
+                blocked_queries_metric = metrics_ref._blocked_queries_family
+                blocked_queries_metric.samples = [
+                    _counter_sample(
+                        blocked_queries_metric, {"hostname": host}, state.blocked_queries_lifetime
+                    )
+                ]
                 yield blocked_queries_metric
 
-        class PiholeDestTotalsCollector:
-            def collect(inner_self):
-                host = metrics_ref.hostname_label
-                forward_destinations_metric = CounterMetricFamily(
-                    "pihole_forward_destinations_total",
-                    (
-                        "Total number of forward destinations requests made by Pi-hole by "
-                        "destination (lifetime, derived from queries table)"
-                    ),
-                    labels=["hostname", "destination", "destination_name"],
-                )
-
-                for dest in sorted(metrics_ref._forward_destinations_lifetime.keys()):
-                    cnt = metrics_ref._forward_destinations_lifetime.get(dest, 0)
-                    forward_destinations_metric.add_metric([host, dest, dest], float(cnt))
-
+                forward_destinations_metric = metrics_ref._forward_destinations_family
+                forward_destinations_metric.samples = metrics_ref._forward_destinations_samples
                 yield forward_destinations_metric
 
-        self.registry.register(PiholeTotalsCollector())
-        self.registry.register(PiholeDestTotalsCollector())
+        self.registry.register(PiholeLifetimeCollector())
 
         self.pihole_ads_blocked_today = Gauge(
             "pihole_ads_blocked_today",
@@ -185,6 +230,13 @@ class Metrics:
             registry=self.registry,
         )
 
+        self.pihole_scrape_today_skipped = Counter(
+            "pihole_scrape_today_skipped",
+            "Scrapes that reused the previous today-window results because no queries were added",
+            ["hostname"],
+            registry=self.registry,
+        )
+
         self.pihole_status = Gauge(
             "pihole_status",
             "Whether Pi-hole is enabled",
@@ -227,50 +279,132 @@ class Metrics:
             registry=self.registry,
         )
 
+        # Keyed by (name, type): a counter family drops its "_total" suffix, so a counter
+        # and a gauge can share a family name while being exposed under different names.
+        self._family_headers = {
+            (family.name, family.type): _family_headers(family)
+            for family in self.registry.collect()
+        }
+        self._label_children: dict[tuple[Gauge, str, tuple[str, ...]], list] = {}
+        self._host_children: dict[tuple[object, str], object] = {}
+        self._dynamic_children: dict[tuple[Gauge, tuple[str, ...]], object] = {}
+        self._dynamic_seen: set[tuple[Gauge, tuple[str, ...]]] = set()
+
     def set_hostname_label(self, label: str) -> None:
         self.hostname_label = label
+        self._build_forward_destinations_samples()
+
+    def host_child(self, metric, host: str):
+        """Return the ``hostname``-only child of ``metric``, resolved once per host."""
+        key = (metric, host)
+        child = self._host_children.get(key)
+        if child is None:
+            child = self._host_children[key] = metric.labels(host)
+        return child
+
+    def host_children(self, gauge: Gauge, host: str, names: tuple[str, ...]) -> list:
+        """Return the ``(host, name)`` children of ``gauge``, resolved once and reused.
+
+        Only for gauges with a fixed label set. Per-scrape series go through
+        ``dynamic_child`` between ``begin_dynamic_series`` and ``prune_dynamic_series``;
+        the prune removes labelsets that disappeared, which would leave children cached
+        here detached from the registry.
+        """
+        key = (gauge, host, names)
+        children = self._label_children.get(key)
+        if children is None:
+            children = [gauge.labels(host, name) for name in names]
+            self._label_children[key] = children
+        return children
+
+    def dynamic_child(self, gauge: Gauge, *labels: str):
+        """Return the child of a per-scrape series, reusing it while its labelset persists.
+
+        Call between ``begin_dynamic_series`` and ``prune_dynamic_series``; labelsets not
+        requested in that window are removed from the gauge by the prune.
+        """
+        key = (gauge, labels)
+        child = self._dynamic_children.get(key)
+        if child is None:
+            child = self._dynamic_children[key] = gauge.labels(*labels)
+        self._dynamic_seen.add(key)
+        return child
+
+    def begin_dynamic_series(self) -> None:
+        self._dynamic_seen = set()
+
+    def prune_dynamic_series(self) -> None:
+        for key in self._dynamic_children.keys() - self._dynamic_seen:
+            gauge, labels = key
+            gauge.remove(*labels)
+            del self._dynamic_children[key]
+        self._dynamic_seen = set()
 
     def set_lifetime_totals(self, total: int, blocked: int) -> None:
         self.state.total_queries_lifetime = total
         self.state.blocked_queries_lifetime = blocked
 
     def set_forward_destinations_lifetime(self, lifetime: dict[str, int]) -> None:
-        self._forward_destinations_lifetime = lifetime
+        # Sorted and turned into samples here, once per DB refresh, rather than on every collect.
+        self._forward_destinations_lifetime = sorted(lifetime.items())
+        self._build_forward_destinations_samples()
+
+    def _build_forward_destinations_samples(self) -> None:
+        host = self.hostname_label
+        family = self._forward_destinations_family
+        self._forward_destinations_samples = [
+            _counter_sample(
+                family, {"hostname": host, "destination": dest, "destination_name": dest}, count
+            )
+            for dest, count in self._forward_destinations_lifetime
+        ]
+
+    def render(self) -> bytes:
+        """Render the registry in the Prometheus text format.
+
+        HELP/TYPE headers are built once per family instead of on every scrape.
+        """
+        buf = bytearray()
+        for family in self.registry.collect():
+            key = (family.name, family.type)
+            headers = self._family_headers.get(key)
+            if headers is None:
+                headers = self._family_headers[key] = _family_headers(family)
+            buf += headers[0]
+            created_name = family.name + "_created"
+            created = []
+            for sample in family.samples:
+                if sample.name == created_name:
+                    created.append(_sample_line(sample))
+                else:
+                    buf += _sample_line(sample)
+            if created:
+                buf += headers[1]
+                buf += b"".join(created)
+        return bytes(buf)
 
     def update_snapshot(self, payload: bytes, timestamp: float | None = None) -> None:
         if timestamp is None:
             timestamp = time.time()
-        with self._snapshot_lock:
-            self._snapshot = MetricsSnapshot(payload=payload, timestamp=timestamp)
+        # Compressed once per scrape so every gzip-capable request reuses the same bytes.
+        payload_gzip = gzip.compress(payload, compresslevel=6, mtime=0) if payload else b""
+        # A new snapshot is only published once per scrape, so its timestamp identifies it.
+        etag = f'"{timestamp:.6f}"' if payload else ""
+        self._snapshot = MetricsSnapshot(
+            payload=payload, timestamp=timestamp, payload_gzip=payload_gzip, etag=etag
+        )
 
     def get_snapshot(self) -> MetricsSnapshot:
-        with self._snapshot_lock:
-            return self._snapshot
+        return self._snapshot
 
     def record_scrape_result(self, success: bool, timestamp: float | None = None) -> None:
         if timestamp is None:
             timestamp = time.time()
-        with self._scrape_status_lock:
-            self._last_scrape_success = 1 if success else 0
-            self._last_scrape_timestamp = timestamp
-            if success:
-                self._last_successful_scrape_timestamp = timestamp
+        last_success_timestamp = timestamp if success else self._scrape_status[2]
+        self._scrape_status = (1 if success else 0, timestamp, last_success_timestamp)
 
     def get_scrape_status(self) -> tuple[int, float, float]:
-        with self._scrape_status_lock:
-            return (
-                self._last_scrape_success,
-                self._last_scrape_timestamp,
-                self._last_successful_scrape_timestamp,
-            )
-
-    def clear_dynamic_series(self) -> None:
-        self.pihole_top_ads.clear()
-        self.pihole_top_queries.clear()
-        self.pihole_top_sources.clear()
-        self.pihole_forward_destinations.clear()
-        self.pihole_forward_destinations_responsetime.clear()
-        self.pihole_forward_destinations_responsevariance.clear()
+        return self._scrape_status
 
 
 METRICS = Metrics("host.docker.internal")
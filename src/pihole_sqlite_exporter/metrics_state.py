@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class MetricsState:
     total_queries_lifetime: int = 0
     blocked_queries_lifetime: int = 0
@@ -1,55 +1,74 @@
-SQL_COUNTER_TOTAL = "SELECT value FROM counters WHERE id = 0;"
-SQL_COUNTER_BLOCKED = "SELECT value FROM counters WHERE id = 1;"
-SQL_CLIENTS_EVER_SEEN = "SELECT COUNT(*) FROM client_by_id;"
+from .constants import BLOCKED_STATUSES
+
+# Embedded once at import so every statement below is a constant string.
+_BLOCKED_LIST = ",".join(str(status) for status in sorted(BLOCKED_STATUSES))
+
+SQL_FTL_TOTALS = """
+SELECT
+  (SELECT value FROM counters WHERE id = 0),
+  (SELECT value FROM counters WHERE id = 1),
+  (SELECT COUNT(*) FROM client_by_id);
+"""
+
 SQL_DOMAIN_BY_ID_COUNT = "SELECT COUNT(*) FROM domain_by_id;"
 SQL_GRAVITY_COUNT = "SELECT COUNT(*) FROM gravity;"
 
+# Opt-in (MANAGE_INDEXES): covers the today-window filters on status and the forward
+# destination aggregates. Pi-hole v6 exposes queries as a view over query_storage.
+SQL_QUERIES_OBJECT_TYPE = "SELECT type FROM sqlite_master WHERE name = 'queries';"
+SQL_CREATE_QUERIES_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_exporter_ts_status_fwd_rt
+ON {table} (timestamp, status, forward, reply_time);
+"""
+
+SQL_MAX_QUERY_ID = "SELECT COALESCE(MAX(id), 0) FROM queries;"
+
 SQL_LIFETIME_FORWARD_DESTS = """
-SELECT forward, COUNT(*)
+SELECT CAST(forward AS TEXT), COUNT(*)
 FROM queries
-WHERE status = 2
+WHERE id > ? AND id <= ?
+  AND status = 2
   AND forward IS NOT NULL
 GROUP BY forward;
 """
 
-SQL_LIFETIME_CACHE = "SELECT COUNT(*) FROM queries WHERE status = 3;"
-SQL_LIFETIME_BLOCKED = "SELECT COUNT(*) FROM queries WHERE status IN ({blocked_list});"
-
-SQL_QUERIES_TODAY = """
-SELECT COUNT(*)
+SQL_LIFETIME_SYNTHETIC = f"""
+SELECT
+  COALESCE(SUM(status = 3), 0),
+  COALESCE(SUM(status IN ({_BLOCKED_LIST})), 0)
 FROM queries
-WHERE timestamp >= ?;
+WHERE id > ? AND id <= ?;
 """
 
-SQL_BLOCKED_TODAY = """
-SELECT COUNT(*)
+SQL_TODAY_SUMMARY = f"""
+SELECT
+  COUNT(*),
+  COALESCE(SUM(status IN ({_BLOCKED_LIST})), 0),
+  COALESCE(SUM(status = 2), 0),
+  COALESCE(SUM(status = 3), 0)
 FROM queries
-WHERE timestamp >= ?
-  AND status IN ({blocked_list});
+WHERE timestamp >= ?;
 """
 
-SQL_UNIQUE_CLIENTS = "SELECT COUNT(DISTINCT client) FROM queries WHERE timestamp >= ?;"
-SQL_UNIQUE_DOMAINS = "SELECT COUNT(DISTINCT domain) FROM queries WHERE timestamp >= ?;"
-
-SQL_QUERY_TYPES = """
-SELECT type, COUNT(*) AS cnt
+SQL_UNIQUE_COUNTS = """
+SELECT COUNT(DISTINCT client), COUNT(DISTINCT domain)
 FROM queries
-WHERE timestamp >= ?
-GROUP BY type;
+WHERE timestamp >= ?;
 """
 
-SQL_REPLY_TYPES = """
-SELECT reply_type, COUNT(*) AS cnt
+SQL_TYPE_REPLY_MATRIX = """
+SELECT type, reply_type, COUNT(*) AS cnt
 FROM queries
 WHERE timestamp >= ?
-GROUP BY reply_type;
+GROUP BY type, reply_type;
 """
 
-SQL_FORWARDED_TODAY = "SELECT COUNT(*) FROM queries WHERE timestamp >= ? AND status = 2;"
-SQL_CACHED_TODAY = "SELECT COUNT(*) FROM queries WHERE timestamp >= ? AND status = 3;"
-
 SQL_FORWARD_DESTS_TODAY = """
-SELECT forward, COUNT(*) AS cnt, AVG(reply_time) AS avg_rt
+SELECT
+  CAST(forward AS TEXT),
+  COUNT(*) AS cnt,
+  AVG(reply_time) AS avg_rt,
+  AVG(reply_time * reply_time) AS avg_rt_sq
 FROM queries
 WHERE timestamp >= ?
   AND status = 2
@@ -57,40 +76,45 @@ WHERE timestamp >= ?
 GROUP BY forward;
 """
 
-SQL_FORWARD_REPLY_TIMES = """
-SELECT reply_time
-FROM queries
-WHERE timestamp >= ?
-  AND status = 2
-  AND forward = ?
-  AND reply_time IS NOT NULL;
-"""
-
-SQL_TOP_ADS = """
-SELECT domain, COUNT(*) AS cnt
-FROM queries
-WHERE timestamp >= ?
-  AND status IN ({blocked_list})
-GROUP BY domain
-ORDER BY cnt DESC
-LIMIT {top_n};
-"""
-
-SQL_TOP_QUERIES = """
-SELECT domain, COUNT(*) AS cnt
-FROM queries
-WHERE timestamp >= ?
-GROUP BY domain
-ORDER BY cnt DESC
-LIMIT {top_n};
+SQL_TOP_LISTS = f"""
+WITH today AS (
+  SELECT domain, client, status
+  FROM queries
+  WHERE timestamp >= :sod
+),
+per_domain AS (
+  SELECT domain, COUNT(*) AS total, SUM(status IN ({_BLOCKED_LIST})) AS blocked
+  FROM today
+  GROUP BY domain
+)
+SELECT * FROM (
+  SELECT 'ads', CAST(domain AS TEXT), blocked AS cnt
+  FROM per_domain
+  WHERE blocked > 0
+  ORDER BY cnt DESC
+  LIMIT :top_n
+)
+UNION ALL
+SELECT * FROM (
+  SELECT 'queries', CAST(domain AS TEXT), total AS cnt
+  FROM per_domain
+  ORDER BY cnt DESC
+  LIMIT :top_n
+)
+UNION ALL
+SELECT * FROM (
+  SELECT 'sources', CAST(client AS TEXT), COUNT(*) AS cnt
+  FROM today
+  GROUP BY client
+  ORDER BY cnt DESC
+  LIMIT :top_n
+);
 """
 
-SQL_TOP_SOURCES = """
-SELECT q.client, COALESCE(c.name,''), COUNT(*) AS cnt
-FROM queries q
-LEFT JOIN client_by_id c ON c.ip = q.client
-WHERE q.timestamp >= ?
-GROUP BY q.client, c.name
-ORDER BY cnt DESC
-LIMIT {top_n};
+# An IP can have several names; rows are ordered so the dict built from them keeps the
+# most recently recorded non-empty name.
+SQL_CLIENT_NAMES = """
+SELECT CAST(ip AS TEXT), COALESCE(name, '')
+FROM client_by_id
+ORDER BY COALESCE(name, '') != '', rowid;
 """
@@ -1,69 +1,95 @@
+import functools
 import logging
+import os
 import sqlite3
 import threading
 import time
-from datetime import datetime
+from contextlib import closing
+from datetime import date, datetime, tzinfo
+from datetime import time as dt_time
+from typing import NamedTuple
+from urllib.parse import quote
 from zoneinfo import ZoneInfo
 
-from prometheus_client import generate_latest
-
 from . import metrics
-from .constants import BLOCKED_STATUSES, QUERY_TYPE_MAP, REPLY_TYPE_MAP
+from .constants import QUERY_TYPE_MAP, REPLY_TYPE_MAP
 from .db import fetch_scalar, sqlite_ro
 from .queries import (
-    SQL_BLOCKED_TODAY,
-    SQL_CACHED_TODAY,
-    SQL_CLIENTS_EVER_SEEN,
-    SQL_COUNTER_BLOCKED,
-    SQL_COUNTER_TOTAL,
+    SQL_CLIENT_NAMES,
+    SQL_CREATE_QUERIES_INDEX,
     SQL_DOMAIN_BY_ID_COUNT,
     SQL_FORWARD_DESTS_TODAY,
-    SQL_FORWARD_REPLY_TIMES,
-    SQL_FORWARDED_TODAY,
+    SQL_FTL_TOTALS,
     SQL_GRAVITY_COUNT,
-    SQL_LIFETIME_BLOCKED,
-    SQL_LIFETIME_CACHE,
     SQL_LIFETIME_FORWARD_DESTS,
-    SQL_QUERIES_TODAY,
-    SQL_QUERY_TYPES,
-    SQL_REPLY_TYPES,
-    SQL_TOP_ADS,
-    SQL_TOP_QUERIES,
-    SQL_TOP_SOURCES,
-    SQL_UNIQUE_CLIENTS,
-    SQL_UNIQUE_DOMAINS,
+    SQL_LIFETIME_SYNTHETIC,
+    SQL_MAX_QUERY_ID,
+    SQL_QUERIES_OBJECT_TYPE,
+    SQL_TODAY_SUMMARY,
+    SQL_TOP_LISTS,
+    SQL_TYPE_REPLY_MATRIX,
+    SQL_UNIQUE_COUNTS,
 )
+from .scraper_state import ScraperState
 from .settings import Settings
 
 logger = logging.getLogger("pihole_sqlite_exporter")
 _SCRAPE_LOCK = threading.Lock()
-_gravity_db_fallback_logged = False
-_gravity_ftl_fallback_logged = False
-_lifetime_dest_cache: dict[str, int] = {}
-_lifetime_dest_cache_ts = 0.0
+_STATE = ScraperState()
+_QUERY_TYPE_SLOTS = max(QUERY_TYPE_MAP) + 1
+_REPLY_TYPE_SLOTS = max(REPLY_TYPE_MAP) + 1
+_QUERY_TYPE_IDS = tuple(QUERY_TYPE_MAP)
+_QUERY_TYPE_NAMES = tuple(QUERY_TYPE_MAP.values())
+_REPLY_TYPE_IDS = tuple(REPLY_TYPE_MAP)
+_REPLY_TYPE_NAMES = tuple(REPLY_TYPE_MAP.values())
 
 
 SETTINGS = Settings.from_env()
 metrics.METRICS.set_hostname_label(SETTINGS.hostname_label)
 
 
-def get_tz() -> ZoneInfo:
+_INVALID_TZ_NAMES: set[str] = set()
+
+
+@functools.lru_cache(maxsize=8)
+def _zoneinfo(name: str) -> ZoneInfo:
+    # Only successful lookups are cached; lru_cache does not keep raised exceptions.
+    return ZoneInfo(name)
+
+
+def _local_tz() -> tzinfo:
+    return datetime.now().astimezone().tzinfo  # type: ignore[return-value]
+
+
+def _load_tz(name: str) -> tzinfo:
     try:
-        return ZoneInfo(SETTINGS.exporter_tz)
+        return _zoneinfo(name)
     except Exception as e:
-        logger.warning(
-            "Invalid EXPORTER_TZ=%r; falling back to local tz. Reason: %s",
-            SETTINGS.exporter_tz,
-            e,
-        )
-        return datetime.now().astimezone().tzinfo  # type: ignore[return-value]
+        if name not in _INVALID_TZ_NAMES:
+            _INVALID_TZ_NAMES.add(name)
+            logger.warning(
+                "Invalid EXPORTER_TZ=%r; falling back to local tz. Reason: %s",
+                name,
+                e,
+            )
+        # The local fallback is a fixed offset, so it is resolved again on every call
+        # to follow DST changes.
+        return _local_tz()
+
+
+def get_tz() -> ZoneInfo:
+    return _load_tz(SETTINGS.exporter_tz)  # type: ignore[return-value]
+
+
+@functools.lru_cache(maxsize=4)
+def _midnight_ts(day: date, tz: tzinfo) -> int:
+    return int(datetime.combine(day, dt_time.min, tzinfo=tz).timestamp())
 
 
 def start_of_day_ts() -> int:
+    # The zone is resolved once per name and midnight once per day, not on every scrape.
     tz = get_tz()
-    now = datetime.now(tz=tz)
-    sod = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    return int(sod.timestamp())
+    return _midnight_ts(datetime.now(tz=tz).date(), tz)
 
 
 def now_ts() -> int:
@@ -71,15 +97,16 @@ def now_ts() -> int:
 
 
 def variance(values):
-    count = len(values)
-    if count == 0:
-        return 0.0
-    mean = sum(values) / count
-    return sum((x - mean) ** 2 for x in values) / count
-
-
-def _blocked_status_list() -> str:
-    return ",".join(str(x) for x in sorted(BLOCKED_STATUSES))
+    # Welford's single pass: works on any iterable and needs no intermediate list.
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    for x in values:
+        count += 1
+        delta = x - mean
+        mean += delta / count
+        m2 += delta * (x - mean)
+    return m2 / count if count else 0.0
 
 
 def _log_context(host: str, sod: int, now: int) -> tuple[str, str, int, int]:
@@ -87,13 +114,17 @@ def _log_context(host: str, sod: int, now: int) -> tuple[str, str, int, int]:
 
 
 def _load_counters(cur: sqlite3.Cursor, host: str) -> tuple[int, int]:
-    metrics.METRICS.pihole_status.labels(host).set(1)
+    metrics.METRICS.host_child(metrics.METRICS.pihole_status, host).set(1)
 
-    total_queries_lifetime = int(fetch_scalar(cur, SQL_COUNTER_TOTAL))
-
-    blocked_queries_lifetime = int(fetch_scalar(cur, SQL_COUNTER_BLOCKED))
+    cur.execute(SQL_FTL_TOTALS)
+    total, blocked, clients_seen = cur.fetchone()
+    total_queries_lifetime = int(total)
+    blocked_queries_lifetime = int(blocked)
 
     metrics.METRICS.set_lifetime_totals(total_queries_lifetime, blocked_queries_lifetime)
+    metrics.METRICS.host_child(metrics.METRICS.pihole_clients_ever_seen, host).set(
+        float(clients_seen)
+    )
     logger.debug(
         "FTL counters: total=%d blocked=%d",
         total_queries_lifetime,
@@ -102,182 +133,306 @@ def _load_counters(cur: sqlite3.Cursor, host: str) -> tuple[int, int]:
     return total_queries_lifetime, blocked_queries_lifetime
 
 
-def _load_lifetime_destinations(cur: sqlite3.Cursor, blocked_list: str) -> None:
-    global _lifetime_dest_cache, _lifetime_dest_cache_ts
+def _load_lifetime_destinations(cur: sqlite3.Cursor, max_id: int) -> None:
     if not SETTINGS.enable_lifetime_dest_counters:
         metrics.METRICS.set_forward_destinations_lifetime({})
-        _lifetime_dest_cache = {}
-        _lifetime_dest_cache_ts = 0.0
+        _STATE.lifetime_dest_cache = {}
+        _STATE.lifetime_dest_cache_ts = 0.0
+        _STATE.lifetime_dest_last_id = 0
         return
 
     cache_seconds = SETTINGS.lifetime_dest_cache_seconds
     now = time.time()
     if (
         cache_seconds > 0
-        and _lifetime_dest_cache
-        and (now - _lifetime_dest_cache_ts) < cache_seconds
+        and _STATE.lifetime_dest_cache
+        and (now - _STATE.lifetime_dest_cache_ts) < cache_seconds
     ):
-        metrics.METRICS.set_forward_destinations_lifetime(_lifetime_dest_cache)
+        # The cached values were published when the cache was filled.
         logger.debug(
             "Lifetime destinations cache hit: age=%.0fs labelsets=%d",
-            now - _lifetime_dest_cache_ts,
-            len(_lifetime_dest_cache),
+            now - _STATE.lifetime_dest_cache_ts,
+            len(_STATE.lifetime_dest_cache),
         )
         return
 
-    lifetime = {}
-    cur.execute(SQL_LIFETIME_FORWARD_DESTS)
-    for fwd, cnt in cur.fetchall():
-        lifetime[str(fwd)] = int(cnt)
-
-    lifetime["cache"] = int(fetch_scalar(cur, SQL_LIFETIME_CACHE))
-
-    lifetime["blocklist"] = int(
-        fetch_scalar(cur, SQL_LIFETIME_BLOCKED.format(blocked_list=blocked_list))
-    )
+    # queries ids only grow, so each refresh counts just the rows added since the last one
+    # and adds them to the running totals instead of rescanning the whole table.
+    last_id = _STATE.lifetime_dest_last_id
+    lifetime = dict(_STATE.lifetime_dest_cache)
+    if max_id < last_id:
+        logger.info("queries ids went backwards; recounting lifetime destinations")
+        last_id = 0
+        lifetime = {}
+
+    bounds = (last_id, max_id)
+    cur.execute(SQL_LIFETIME_FORWARD_DESTS, bounds)
+    for dest, cnt in cur:
+        lifetime[dest] = lifetime.get(dest, 0) + int(cnt)
+
+    cur.execute(SQL_LIFETIME_SYNTHETIC, bounds)
+    cached, blocked = cur.fetchone()
+    lifetime["cache"] = lifetime.get("cache", 0) + int(cached)
+    lifetime["blocklist"] = lifetime.get("blocklist", 0) + int(blocked)
 
     metrics.METRICS.set_forward_destinations_lifetime(lifetime)
-    _lifetime_dest_cache = dict(lifetime)
-    _lifetime_dest_cache_ts = now
-    logger.debug("Lifetime destinations computed: %d labelsets", len(lifetime))
+    _STATE.lifetime_dest_cache = lifetime
+    _STATE.lifetime_dest_cache_ts = now
+    _STATE.lifetime_dest_last_id = max_id
+    logger.debug(
+        "Lifetime destinations updated: %d labelsets, ids %d..%d",
+        len(lifetime),
+        last_id + 1,
+        max_id,
+    )
 
 
-def _load_clients_ever_seen(cur: sqlite3.Cursor, host: str) -> None:
-    clients_seen = float(fetch_scalar(cur, SQL_CLIENTS_EVER_SEEN))
-    metrics.METRICS.pihole_clients_ever_seen.labels(host).set(clients_seen)
+class TodaySummary(NamedTuple):
+    queries: int
+    blocked: int
+    forwarded: int
+    cached: int
 
 
-def _load_queries_today(cur: sqlite3.Cursor, host: str, sod: int, blocked_list: str) -> None:
-    q_today = int(fetch_scalar(cur, SQL_QUERIES_TODAY, (sod,)))
+def _load_today_summary(cur: sqlite3.Cursor, sod: int) -> TodaySummary:
+    cur.execute(SQL_TODAY_SUMMARY, (sod,))
+    return TodaySummary(*(int(value) for value in cur.fetchone()))
 
-    b_today = int(fetch_scalar(cur, SQL_BLOCKED_TODAY.format(blocked_list=blocked_list), (sod,)))
 
-    metrics.METRICS.pihole_dns_queries_today.labels(host).set(float(q_today))
-    metrics.METRICS.pihole_dns_queries_all_types.labels(host).set(float(q_today))
-    metrics.METRICS.pihole_ads_blocked_today.labels(host).set(float(b_today))
-    metrics.METRICS.pihole_ads_percentage_today.labels(host).set(
-        (b_today / q_today * 100.0) if q_today > 0 else 0.0
+def _set_queries_today(host: str, today: TodaySummary) -> None:
+    metrics.METRICS.host_child(metrics.METRICS.pihole_dns_queries_today, host).set(
+        float(today.queries)
+    )
+    metrics.METRICS.host_child(metrics.METRICS.pihole_dns_queries_all_types, host).set(
+        float(today.queries)
+    )
+    metrics.METRICS.host_child(metrics.METRICS.pihole_ads_blocked_today, host).set(
+        float(today.blocked)
+    )
+    metrics.METRICS.host_child(metrics.METRICS.pihole_ads_percentage_today, host).set(
+        (today.blocked / today.queries * 100.0) if today.queries > 0 else 0.0
     )
 
 
 def _load_unique_counts(cur: sqlite3.Cursor, host: str, now: int) -> None:
-    unique_clients = float(fetch_scalar(cur, SQL_UNIQUE_CLIENTS, (now - 86400,)))
-    metrics.METRICS.pihole_unique_clients.labels(host).set(unique_clients)
+    cur.execute(SQL_UNIQUE_COUNTS, (now - 86400,))
+    unique_clients, unique_domains = cur.fetchone()
+    metrics.METRICS.host_child(metrics.METRICS.pihole_unique_clients, host).set(
+        float(unique_clients)
+    )
+    metrics.METRICS.host_child(metrics.METRICS.pihole_unique_domains, host).set(
+        float(unique_domains)
+    )
 
-    unique_domains = float(fetch_scalar(cur, SQL_UNIQUE_DOMAINS, (now - 86400,)))
-    metrics.METRICS.pihole_unique_domains.labels(host).set(unique_domains)
 
+def _histogram(rows, slots: int) -> list[int]:
+    counts = [0] * slots
+    for key, count in rows:
+        if key is not None and 0 <= key < slots:
+            counts[key] += count
+    return counts
 
-def _load_query_types(cur: sqlite3.Cursor, host: str, sod: int) -> None:
-    cur.execute(SQL_QUERY_TYPES, (sod,))
-    counts_by_type = {k: 0 for k in QUERY_TYPE_MAP.keys()}
-    for t, c in cur.fetchall():
-        counts_by_type[int(t)] = int(c)
-    for tid, name in QUERY_TYPE_MAP.items():
-        metrics.METRICS.pihole_querytypes.labels(host, name).set(float(counts_by_type.get(tid, 0)))
 
+def _load_type_reply_matrix(cur: sqlite3.Cursor, host: str, sod: int) -> None:
+    # One GROUP BY over (type, reply_type) feeds both histograms; the matrix is at most
+    # a few hundred rows, so folding it down in Python is cheaper than a second scan.
+    cur.execute(SQL_TYPE_REPLY_MATRIX, (sod,))
+    rows = cur.fetchall()
 
-def _load_reply_types(cur: sqlite3.Cursor, host: str, sod: int) -> None:
-    cur.execute(SQL_REPLY_TYPES, (sod,))
-    counts_by_reply = {k: 0 for k in REPLY_TYPE_MAP.keys()}
-    for rt, c in cur.fetchall():
-        if rt is None:
-            continue
-        counts_by_reply[int(rt)] = int(c)
-    for rid, label in REPLY_TYPE_MAP.items():
-        metrics.METRICS.pihole_reply.labels(host, label).set(float(counts_by_reply.get(rid, 0)))
+    type_counts = _histogram(((qtype, cnt) for qtype, _reply, cnt in rows), _QUERY_TYPE_SLOTS)
+    children = metrics.METRICS.host_children(
+        metrics.METRICS.pihole_querytypes, host, _QUERY_TYPE_NAMES
+    )
+    for tid, child in zip(_QUERY_TYPE_IDS, children, strict=True):
+        child.set(float(type_counts[tid]))
+
+    reply_counts = _histogram(((reply, cnt) for _qtype, reply, cnt in rows), _REPLY_TYPE_SLOTS)
+    children = metrics.METRICS.host_children(metrics.METRICS.pihole_reply, host, _REPLY_TYPE_NAMES)
+    for rid, child in zip(_REPLY_TYPE_IDS, children, strict=True):
+        child.set(float(reply_counts[rid]))
 
 
-def _load_forwarded_cached(cur: sqlite3.Cursor, host: str, sod: int) -> None:
-    forwarded = int(fetch_scalar(cur, SQL_FORWARDED_TODAY, (sod,)))
+def _set_forwarded_cached(host: str, today: TodaySummary) -> None:
+    metrics.METRICS.host_child(metrics.METRICS.pihole_queries_forwarded, host).set(
+        float(today.forwarded)
+    )
+    metrics.METRICS.host_child(metrics.METRICS.pihole_queries_cached, host).set(float(today.cached))
 
-    cached = int(fetch_scalar(cur, SQL_CACHED_TODAY, (sod,)))
 
-    metrics.METRICS.pihole_queries_forwarded.labels(host).set(float(forwarded))
-    metrics.METRICS.pihole_queries_cached.labels(host).set(float(cached))
+def _set_destination(host: str, dest: str, count: float, mean: float, variance: float) -> None:
+    child = metrics.METRICS.dynamic_child
+    child(metrics.METRICS.pihole_forward_destinations, host, dest, dest).set(count)
+    child(metrics.METRICS.pihole_forward_destinations_responsetime, host, dest, dest).set(mean)
+    child(metrics.METRICS.pihole_forward_destinations_responsevariance, host, dest, dest).set(
+        variance
+    )
 
 
 def _load_forward_destinations(cur: sqlite3.Cursor, host: str, sod: int) -> None:
     cur.execute(SQL_FORWARD_DESTS_TODAY, (sod,))
-    forwards = cur.fetchall()
-    for fwd, cnt, avg_rt in forwards:
-        dest = str(fwd)
-        metrics.METRICS.pihole_forward_destinations.labels(host, dest, dest).set(float(cnt))
-        metrics.METRICS.pihole_forward_destinations_responsetime.labels(host, dest, dest).set(
-            float(avg_rt or 0.0)
+    for dest, cnt, avg_rt, avg_rt_sq in cur:
+        mean = float(avg_rt or 0.0)
+        # E[X^2] - E[X]^2 can dip below zero through float rounding.
+        _set_destination(
+            host, dest, float(cnt), mean, max(0.0, float(avg_rt_sq or 0.0) - mean * mean)
         )
 
-        cur.execute(SQL_FORWARD_REPLY_TIMES, (sod, fwd))
-        vals = [float(r[0]) for r in cur.fetchall()]
-        metrics.METRICS.pihole_forward_destinations_responsevariance.labels(host, dest, dest).set(
-            float(variance(vals))
-        )
 
+def _set_synthetic_destinations(host: str, today: TodaySummary) -> None:
+    _set_destination(host, "cache", float(today.cached), 0.0, 0.0)
+    _set_destination(host, "blocklist", float(today.blocked), 0.0, 0.0)
 
-def _load_synthetic_destinations(
-    cur: sqlite3.Cursor, host: str, sod: int, blocked_list: str
-) -> None:
-    cache_cnt = int(fetch_scalar(cur, SQL_CACHED_TODAY, (sod,)))
-    metrics.METRICS.pihole_forward_destinations.labels(host, "cache", "cache").set(float(cache_cnt))
-    metrics.METRICS.pihole_forward_destinations_responsetime.labels(host, "cache", "cache").set(0.0)
-    metrics.METRICS.pihole_forward_destinations_responsevariance.labels(host, "cache", "cache").set(
-        0.0
-    )
-
-    bl_cnt = int(fetch_scalar(cur, SQL_BLOCKED_TODAY.format(blocked_list=blocked_list), (sod,)))
-    metrics.METRICS.pihole_forward_destinations.labels(host, "blocklist", "blocklist").set(
-        float(bl_cnt)
-    )
-    metrics.METRICS.pihole_forward_destinations_responsetime.labels(
-        host, "blocklist", "blocklist"
-    ).set(0.0)
-    metrics.METRICS.pihole_forward_destinations_responsevariance.labels(
-        host, "blocklist", "blocklist"
-    ).set(0.0)
-
-
-def _load_top_lists(
-    cur: sqlite3.Cursor, host: str, sod: int, blocked_list: str, top_n: int
-) -> None:
-    cur.execute(SQL_TOP_ADS.format(blocked_list=blocked_list, top_n=top_n), (sod,))
-    for domain, cnt in cur.fetchall():
-        metrics.METRICS.pihole_top_ads.labels(host, str(domain)).set(float(cnt))
-
-    cur.execute(SQL_TOP_QUERIES.format(top_n=top_n), (sod,))
-    for domain, cnt in cur.fetchall():
-        metrics.METRICS.pihole_top_queries.labels(host, str(domain)).set(float(cnt))
-
-    cur.execute(SQL_TOP_SOURCES.format(top_n=top_n), (sod,))
-    for ip, name, cnt in cur.fetchall():
-        metrics.METRICS.pihole_top_sources.labels(host, str(ip), str(name or "")).set(float(cnt))
 
+def _load_top_lists(cur: sqlite3.Cursor, host: str, sod: int, top_n: int) -> None:
+    cur.execute(SQL_TOP_LISTS, {"sod": sod, "top_n": top_n})
+    sources = []
+    child = metrics.METRICS.dynamic_child
+    for kind, key, cnt in cur:
+        if kind == "ads":
+            child(metrics.METRICS.pihole_top_ads, host, key).set(float(cnt))
+        elif kind == "queries":
+            child(metrics.METRICS.pihole_top_queries, host, key).set(float(cnt))
+        else:
+            sources.append((key, cnt))
+    if not sources:
+        return
+    cur.execute(SQL_CLIENT_NAMES)
+    names = dict(cur)
+    for ip, cnt in sources:
+        child(metrics.METRICS.pihole_top_sources, host, ip, names.get(ip, "")).set(float(cnt))
+
+
+def _load_today_window(cur: sqlite3.Cursor, host: str, sod: int, max_id: int) -> None:
+    # queries is append-only, so while the day and the highest id are unchanged every
+    # today-window aggregate would come back identical; keep the published values.
+    watermark = (sod, max_id)
+    skipped = metrics.METRICS.host_child(metrics.METRICS.pihole_scrape_today_skipped, host)
+    if watermark == _STATE.today_watermark:
+        skipped.inc()
+        logger.debug("No new queries since last scrape; reusing today-window metrics")
+        return
 
-def _load_domains_blocked(host: str) -> None:
-    global _gravity_db_fallback_logged, _gravity_ftl_fallback_logged
+    _STATE.today_watermark = None
+    # Children of series that survive from the last reload are reused; labelsets that
+    # did not come back this time are dropped once every loader has run.
+    metrics.METRICS.begin_dynamic_series()
+    today = _load_today_summary(cur, sod)
+    _set_queries_today(host, today)
+    _load_type_reply_matrix(cur, host, sod)
+    _set_forwarded_cached(host, today)
+    _load_forward_destinations(cur, host, sod)
+    _set_synthetic_destinations(host, today)
+    _load_top_lists(cur, host, sod, SETTINGS.top_n)
+    metrics.METRICS.prune_dynamic_series()
+    _STATE.today_watermark = watermark
+
+
+def _gravity_domain_count() -> int:
+    # gravity.db is rebuilt by `pihole -g`, which changes its inode, mtime or size; until
+    # then the COUNT(*) result is reused instead of rescanning the table every scrape.
+    st = os.stat(SETTINGS.gravity_db_path)
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if key == _STATE.gravity_count_key:
+        return _STATE.gravity_count
+    with closing(sqlite_ro(SETTINGS.gravity_db_path)) as gconn:
+        count = int(fetch_scalar(gconn.cursor(), SQL_GRAVITY_COUNT))
+    _STATE.gravity_count_key = key
+    _STATE.gravity_count = count
+    return count
+
+
+def _load_domains_blocked(cur: sqlite3.Cursor, host: str) -> None:
     domains_value = None
     try:
-        with sqlite_ro(SETTINGS.gravity_db_path) as gconn:
-            gcur = gconn.cursor()
-            domains_value = int(fetch_scalar(gcur, SQL_GRAVITY_COUNT))
+        domains_value = _gravity_domain_count()
     except Exception as e:
-        if not _gravity_db_fallback_logged:
+        _STATE.gravity_count_key = None
+        if not _STATE.gravity_db_fallback_logged:
             logger.info("Gravity DB unavailable; falling back (reason: %s)", e)
-            _gravity_db_fallback_logged = True
+            _STATE.gravity_db_fallback_logged = True
         domains_value = None
 
     if domains_value is None:
         try:
-            with sqlite_ro(SETTINGS.ftl_db_path) as conn:
-                cur = conn.cursor()
-                domains_value = int(fetch_scalar(cur, SQL_DOMAIN_BY_ID_COUNT))
-                if not _gravity_ftl_fallback_logged:
-                    logger.info("Gravity DB fallback: using FTL domain count")
-                    _gravity_ftl_fallback_logged = True
+            domains_value = int(fetch_scalar(cur, SQL_DOMAIN_BY_ID_COUNT))
+            if not _STATE.gravity_ftl_fallback_logged:
+                logger.info("Gravity DB fallback: using FTL domain count")
+                _STATE.gravity_ftl_fallback_logged = True
         except Exception as e:
             logger.warning("Fallback domain count failed: %s", e)
             domains_value = 0
 
-    metrics.METRICS.pihole_domains_being_blocked.labels(host).set(float(domains_value))
+    metrics.METRICS.host_child(metrics.METRICS.pihole_domains_being_blocked, host).set(
+        float(domains_value)
+    )
+
+
+def _ftl_connection() -> sqlite3.Connection:
+    # Kept open between scrapes so SQLite's page cache and mmap stay warm. The inode is
+    # part of the key so a replaced database file gets a fresh connection.
+    path = SETTINGS.ftl_db_path
+    try:
+        inode = os.stat(path).st_ino
+    except OSError:
+        inode = 0
+    key = (path, inode)
+    if _STATE.ftl_conn is not None and _STATE.ftl_conn_key == key:
+        return _STATE.ftl_conn
+    _close_ftl_connection()
+    # Scrapes run on the startup thread first and the background thread afterwards;
+    # _SCRAPE_LOCK keeps them from using the connection at the same time.
+    _STATE.ftl_conn = sqlite_ro(path, check_same_thread=False)
+    _STATE.ftl_conn_key = key
+    return _STATE.ftl_conn
+
+
+def _close_ftl_connection() -> None:
+    conn = _STATE.ftl_conn
+    _STATE.ftl_conn = None
+    _STATE.ftl_conn_key = None
+    if conn is not None:
+        conn.close()
+
+
+def ensure_query_indexes() -> bool:
+    """Create the exporter's covering index on the FTL queries table (MANAGE_INDEXES).
+
+    This is the only write the exporter ever makes; failures are logged and ignored.
+    """
+    path = SETTINGS.ftl_db_path
+    if path.startswith("file:"):
+        dsn = path
+    else:
+        # Without mode=rw a wrong path would create an empty FTL DB for FTL to start on.
+        if not os.path.exists(path):
+            logger.warning("FTL DB %s does not exist; skipping query indexes", path)
+            return False
+        dsn = f"file:{quote(path, safe='/')}?mode=rw"
+    try:
+        with closing(sqlite3.connect(dsn, uri=True)) as conn:
+            table = "queries"
+            if fetch_scalar(conn.cursor(), SQL_QUERIES_OBJECT_TYPE) == "view":
+                table = "query_storage"
+            with conn:
+                conn.execute(SQL_CREATE_QUERIES_INDEX.format(table=table))
+    except sqlite3.Error as e:
+        logger.warning("Could not create query indexes on %s: %s", path, e)
+        return False
+    logger.info("Query indexes ensured on %s (%s)", path, table)
+    return True
+
+
+def _publish_scrape_result(host: str, duration: float, success: float) -> None:
+    # Runs while the scrape lock is held so the snapshot is rendered exactly once per
+    # scrape and never interleaves with the gauge updates of the next one.
+    scrape_timestamp = time.time()
+    metrics.METRICS.host_child(metrics.METRICS.pihole_scrape_duration_seconds, host).set(duration)
+    metrics.METRICS.host_child(metrics.METRICS.pihole_scrape_success, host).set(success)
+    metrics.METRICS.record_scrape_result(success == 1.0, timestamp=scrape_timestamp)
+    try:
+        metrics.METRICS.update_snapshot(metrics.METRICS.render(), timestamp=scrape_timestamp)
+    except Exception:
+        logger.exception("Failed to update metrics snapshot cache")
 
 
 def scrape_and_update():
@@ -295,7 +450,7 @@ def scrape_and_update():
     sod = start_of_day_ts()
     now = now_ts()
     ctx = _log_context(host, sod, now)
-    start = time.perf_counter()
+    start_ns = time.perf_counter_ns()
     success = 0.0
 
     logger.debug(
@@ -307,26 +462,22 @@ def scrape_and_update():
     )
 
     try:
-        metrics.METRICS.clear_dynamic_series()
-        blocked_list = _blocked_status_list()
-
-        with sqlite_ro(SETTINGS.ftl_db_path) as conn:
-            cur = conn.cursor()
+        # One FTL connection serves every query of the scrape, including the domain
+        # count fallback.
+        cur = _ftl_connection().cursor()
+        try:
             _load_counters(cur, host)
-            _load_lifetime_destinations(cur, blocked_list)
-            _load_clients_ever_seen(cur, host)
-            _load_queries_today(cur, host, sod, blocked_list)
+            max_id = int(fetch_scalar(cur, SQL_MAX_QUERY_ID))
+            _load_lifetime_destinations(cur, max_id)
+            _load_today_window(cur, host, sod, max_id)
             _load_unique_counts(cur, host, now)
-            _load_query_types(cur, host, sod)
-            _load_reply_types(cur, host, sod)
-            _load_forwarded_cached(cur, host, sod)
-            _load_forward_destinations(cur, host, sod)
-            _load_synthetic_destinations(cur, host, sod, blocked_list)
-            _load_top_lists(cur, host, sod, blocked_list, SETTINGS.top_n)
-
-        _load_domains_blocked(host)
+            _load_domains_blocked(cur, host)
+        finally:
+            cur.close()
+
         success = 1.0
     except Exception:
+        _close_ftl_connection()
         logger.exception(
             "Scrape failed (host=%s, tz=%s, sod=%s, now=%s)",
             ctx[0],
@@ -336,19 +487,11 @@ def scrape_and_update():
         )
         raise
     finally:
-        _SCRAPE_LOCK.release()
-        duration = time.perf_counter() - start
-        scrape_timestamp = time.time()
-        metrics.METRICS.pihole_scrape_duration_seconds.labels(host).set(duration)
-        metrics.METRICS.pihole_scrape_success.labels(host).set(success)
-        metrics.METRICS.record_scrape_result(success == 1.0, timestamp=scrape_timestamp)
+        duration = (time.perf_counter_ns() - start_ns) / 1e9
         try:
-            metrics.METRICS.update_snapshot(
-                generate_latest(metrics.METRICS.registry),
-                timestamp=scrape_timestamp,
-            )
-        except Exception:
-            logger.exception("Failed to update metrics snapshot cache")
+            _publish_scrape_result(host, duration, success)
+        finally:
+            _SCRAPE_LOCK.release()
         logger.debug(
             "Scrape completed (host=%s, tz=%s, sod=%s, now=%s) duration=%.3fs success=%s",
             ctx[0],
@@ -362,29 +505,44 @@ def scrape_and_update():
 
 def _scrape_loop(
     stop_event: threading.Event | None = None,
-    sleep_fn=time.sleep,
-    time_fn=time.time,
+    sleep_fn=None,
+    time_fn=time.monotonic,
     initial_delay: float = 0.0,
 ) -> None:
+    if sleep_fn is None:
+        # Waiting on the stop event lets a shutdown interrupt the sleep instead of
+        # lingering for up to a full interval.
+        sleep_fn = stop_event.wait if stop_event is not None else time.sleep
     interval = max(1, SETTINGS.scrape_interval)
     if initial_delay > 0:
         sleep_fn(initial_delay)
+    deadline = time_fn()
     while True:
         if stop_event is not None and stop_event.is_set():
             return
-        start = time_fn()
         try:
             scrape_and_update()
         except Exception:
             logger.warning("Background scrape failed")
-        elapsed = time_fn() - start
-        sleep_fn(max(1.0, interval - elapsed))
+        deadline += interval
+        now = time_fn()
+        if deadline <= now:
+            # Missed at least one slot; start a fresh schedule instead of catching up in a burst.
+            logger.warning(
+                "Scrape overran SCRAPE_INTERVAL=%ss by %.1fs; rescheduling",
+                interval,
+                now - deadline,
+            )
+            deadline = now + interval
+        sleep_fn(deadline - now)
 
 
-def start_background_scrape(initial_delay: float = 0.0) -> threading.Thread:
+def start_background_scrape(
+    initial_delay: float = 0.0, stop_event: threading.Event | None = None
+) -> threading.Thread:
     thread = threading.Thread(
         target=_scrape_loop,
-        kwargs={"initial_delay": initial_delay},
+        kwargs={"initial_delay": initial_delay, "stop_event": stop_event},
         daemon=True,
     )
     thread.start()
@@ -0,0 +1,16 @@
+import sqlite3
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class ScraperState:
+    gravity_db_fallback_logged: bool = False
+    gravity_ftl_fallback_logged: bool = False
+    lifetime_dest_cache: dict[str, int] = field(default_factory=dict)
+    lifetime_dest_cache_ts: float = 0.0
+    lifetime_dest_last_id: int = 0
+    gravity_count_key: tuple[int, int, int] | None = None
+    gravity_count: int = 0
+    today_watermark: tuple[int, int] | None = None
+    ftl_conn: sqlite3.Connection | None = None
+    ftl_conn_key: tuple[str, int] | None = None
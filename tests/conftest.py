@@ -1,3 +1,9 @@
+import functools
+import inspect
+import shutil
+import sqlite3
+from collections.abc import Callable
+from datetime import UTC, datetime
 from pathlib import Path
 
 import pytest
@@ -5,6 +11,8 @@ from fixtures import (
     add_queries as _add_queries,
 )
 from fixtures import (
+    configure_exporter,
+    connect_unsynced,
     create_ftl_db,
     create_gravity_db,
 )
@@ -13,97 +21,174 @@ from fixtures import (
 )
 
 from pihole_sqlite_exporter import metrics, scraper
+from pihole_sqlite_exporter.scraper_state import ScraperState
+
+
+@pytest.fixture(autouse=True)
+def scraper_state(monkeypatch: pytest.MonkeyPatch):
+    state = ScraperState()
+    monkeypatch.setattr(scraper, "_STATE", state)
+    yield state
+    if state.ftl_conn is not None:
+        state.ftl_conn.close()
+
+
+_FTL_DEFAULTS = {
+    name: param.default
+    for name, param in inspect.signature(create_ftl_db).parameters.items()
+    if param.default is not param.empty
+}
+
+
+@pytest.fixture(scope="session")
+def _ftl_template(tmp_path_factory: pytest.TempPathFactory) -> Callable[[], Path]:
+    # The default rows are timestamped relative to "now", so a template built before UTC
+    # midnight would put them in yesterday's window; one is built per day instead.
+    root = tmp_path_factory.mktemp("templates")
+
+    def _template() -> Path:
+        path = root / f"pihole-FTL-{datetime.now(UTC).date()}.db"
+        if not path.exists():
+            create_ftl_db(path)
+        return path
+
+    return _template
+
+
+@pytest.fixture(scope="session")
+def _gravity_template(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    path = tmp_path_factory.mktemp("templates") / "gravity.db"
+    create_gravity_db(path)
+    return path
 
 
 @pytest.fixture
-def ftl_db(tmp_path: Path) -> Path:
+def ftl_db(tmp_path: Path, _ftl_template: Callable[[], Path]) -> Path:
     path = tmp_path / "pihole-FTL.db"
-    create_ftl_db(path)
+    shutil.copyfile(_ftl_template(), path)
     return path
 
 
 @pytest.fixture
-def ftl_db_factory(tmp_path: Path):
-    def _factory(
-        *,
-        counters: tuple[int, int] = (5, 1),
-        queries: list[tuple[int, int, int, int | None, str | None, float | None, str, str]]
-        | None = None,
-        clients: list[tuple[str, str]] | None = None,
-        domain_count: int = 2,
-    ) -> Path:
+def ftl_db_factory(tmp_path: Path, _ftl_template: Callable[[], Path]):
+    def _factory(**options) -> Path:
         path = tmp_path / "pihole-FTL.db"
-        create_ftl_db(
-            path, counters=counters, queries=queries, clients=clients, domain_count=domain_count
-        )
+        # Only options equal to create_ftl_db's own defaults can reuse the template.
+        if options.items() <= _FTL_DEFAULTS.items():
+            shutil.copyfile(_ftl_template(), path)
+            return path
+        create_ftl_db(path, **options)
         return path
 
     return _factory
 
 
 @pytest.fixture
-def update_counters():
+def sqlite_ro_opens(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    # Records the path of every read-only connection the scraper opens.
+    opened: list[str] = []
+    real_sqlite_ro = scraper.sqlite_ro
+
+    def _counting_sqlite_ro(path: str, **kwargs):
+        opened.append(path)
+        return real_sqlite_ro(path, **kwargs)
+
+    monkeypatch.setattr(scraper, "sqlite_ro", _counting_sqlite_ro)
+    return opened
+
+
+@pytest.fixture
+def db_writer():
+    conns: dict[Path, sqlite3.Connection] = {}
+
+    def _get(path: Path) -> sqlite3.Connection:
+        conn = conns.get(path)
+        if conn is None:
+            conn = conns[path] = connect_unsynced(path)
+        return conn
+
+    yield _get
+    for conn in conns.values():
+        conn.close()
+
+
+@pytest.fixture
+def update_counters(db_writer):
     def _update(path: Path, total: int, blocked: int) -> None:
-        _update_counters(path, total, blocked)
+        _update_counters(db_writer(path), total, blocked)
 
     return _update
 
 
 @pytest.fixture
-def add_queries():
+def add_queries(db_writer):
     def _add(
         path: Path,
         queries: list[tuple[int, int, int, int | None, str | None, float | None, str, str]],
     ) -> None:
-        _add_queries(path, queries)
+        _add_queries(db_writer(path), queries)
 
     return _add
 
 
 @pytest.fixture
-def gravity_db(tmp_path: Path) -> Path:
+def gravity_db(tmp_path: Path, _gravity_template: Path) -> Path:
     path = tmp_path / "gravity.db"
-    create_gravity_db(path)
+    shutil.copyfile(_gravity_template, path)
     return path
 
 
 @pytest.fixture
 def exporter_config(monkeypatch: pytest.MonkeyPatch, ftl_db: Path, gravity_db: Path) -> None:
-    monkeypatch.setattr(scraper.SETTINGS, "ftl_db_path", str(ftl_db))
-    monkeypatch.setattr(scraper.SETTINGS, "gravity_db_path", str(gravity_db))
-    monkeypatch.setattr(scraper.SETTINGS, "hostname_label", "test-host")
-    monkeypatch.setattr(scraper.SETTINGS, "exporter_tz", "UTC")
-    monkeypatch.setattr(scraper.SETTINGS, "top_n", 10)
-    monkeypatch.setattr(scraper.SETTINGS, "enable_lifetime_dest_counters", False)
-    metrics.METRICS.set_hostname_label("test-host")
-
-
-@pytest.fixture
-def metrics_text(exporter_config: None) -> str:
-    scraper.scrape_and_update()
-    snapshot = metrics.METRICS.get_snapshot()
-    return snapshot.payload.decode("utf-8")
+    configure_exporter(monkeypatch, ftl_db, gravity_db)
+
+
+@pytest.fixture(scope="module")
+def metrics_text(
+    tmp_path_factory: pytest.TempPathFactory,
+    _ftl_template: Callable[[], Path],
+    _gravity_template: Path,
+) -> str:
+    # One scrape of the default databases, shared by every read-only test in a module.
+    tmp_path = tmp_path_factory.mktemp("scrape")
+    ftl_db = shutil.copyfile(_ftl_template(), tmp_path / "pihole-FTL.db")
+    gravity_db = shutil.copyfile(_gravity_template, tmp_path / "gravity.db")
+    state = ScraperState()
+    with pytest.MonkeyPatch.context() as mp:
+        configure_exporter(mp, ftl_db, gravity_db)
+        mp.setattr(scraper, "_STATE", state)
+        try:
+            scraper.scrape_and_update()
+        finally:
+            if state.ftl_conn is not None:
+                state.ftl_conn.close()
+        return metrics.METRICS.get_snapshot().payload.decode("utf-8")
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_exposition(text: str) -> dict[str, list[tuple[dict[str, str], float]]]:
+    samples: dict[str, list[tuple[dict[str, str], float]]] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        name, _, label_part = series.partition("{")
+        labels = {}
+        for item in label_part.rstrip("}").split(","):
+            if item:
+                key, _, label_value = item.partition("=")
+                labels[key] = label_value.strip('"')
+        samples.setdefault(name, []).append((labels, float(value)))
+    return samples
 
 
 @pytest.fixture
 def metric_value():
     def _metric_value(text: str, name: str, labels: dict[str, str] | None = None) -> float:
-        for line in text.splitlines():
-            if line.startswith("#") or not line.startswith(name):
-                continue
-            if labels:
-                if "{" not in line:
-                    continue
-                label_part = line.split("{", 1)[1].split("}", 1)[0]
-                label_items = {}
-                for item in label_part.split(","):
-                    if not item:
-                        continue
-                    key, value = item.split("=", 1)
-                    label_items[key] = value.strip('"')
-                if any(label_items.get(k) != v for k, v in labels.items()):
-                    continue
-            return float(line.split()[-1])
+        wanted = (labels or {}).items()
+        for sample_labels, value in _parse_exposition(text).get(name, ()):
+            if wanted <= sample_labels.items():
+                return value
         raise AssertionError(f"Metric {name} with labels {labels} not found")
 
     return _metric_value
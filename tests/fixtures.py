@@ -1,7 +1,19 @@
 import sqlite3
 import time
+from contextlib import closing
 from pathlib import Path
 
+import pytest
+
+from pihole_sqlite_exporter import metrics, scraper
+
+# Default query rows, with the timestamp as an offset from the database's "now".
+_DEFAULT_QUERIES = (
+    (-10, 2, 1, 3, "1.1.1.1", 0.1, "example.com", "10.0.0.1"),
+    (-20, 3, 2, 2, None, None, "cached.com", "10.0.0.2"),
+    (-30, 1, 1, 2, None, None, "ads.com", "10.0.0.1"),
+)
+
 
 def create_ftl_db(
     path: Path,
@@ -15,25 +27,50 @@ def create_ftl_db(
     if now_ts is None:
         now_ts = int(time.time())
 
-    conn = sqlite3.connect(path)
+    with closing(sqlite3.connect(":memory:")) as conn:
+        _populate_ftl_db(conn, now_ts, counters, queries, clients, domain_count)
+        _write_to(conn, path)
+
+
+def _write_to(conn: sqlite3.Connection, path: Path) -> None:
+    # Built in memory and copied page by page, so the file is written once without
+    # per-statement journaling.
+    with closing(connect_unsynced(path)) as dst:
+        conn.backup(dst)
+
+
+def _populate_ftl_db(
+    conn: sqlite3.Connection,
+    now_ts: int,
+    counters: tuple[int, int],
+    queries: list[tuple[int, int, int, int | None, str | None, float | None, str, str]] | None,
+    clients: list[tuple[str, str]] | None,
+    domain_count: int,
+) -> None:
     cur = conn.cursor()
     cur.execute("CREATE TABLE counters (id INTEGER, value INTEGER);")
-    cur.executemany(
-        "INSERT INTO counters (id, value) VALUES (?, ?);",
-        [(0, counters[0]), (1, counters[1])],
-    )
+    cur.execute("INSERT INTO counters (id, value) VALUES (0, ?), (1, ?);", counters)
     cur.execute("CREATE TABLE client_by_id (ip TEXT, name TEXT);")
     if clients is None:
         clients = [("10.0.0.1", "client-a"), ("10.0.0.2", "")]
     cur.executemany("INSERT INTO client_by_id (ip, name) VALUES (?, ?);", clients)
     cur.execute("CREATE TABLE domain_by_id (id INTEGER);")
-    cur.executemany(
-        "INSERT INTO domain_by_id (id) VALUES (?);", [(idx,) for idx in range(domain_count)]
+    cur.execute(
+        """
+        WITH RECURSIVE seq(id) AS (
+            SELECT 0 WHERE :n > 0
+            UNION ALL
+            SELECT id + 1 FROM seq WHERE id + 1 < :n
+        )
+        INSERT INTO domain_by_id (id) SELECT id FROM seq;
+        """,
+        {"n": domain_count},
     )
 
     cur.execute(
         """
         CREATE TABLE queries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp INTEGER,
             status INTEGER,
             type INTEGER,
@@ -46,11 +83,7 @@ def create_ftl_db(
         """
     )
     if queries is None:
-        queries = [
-            (now_ts - 10, 2, 1, 3, "1.1.1.1", 0.1, "example.com", "10.0.0.1"),
-            (now_ts - 20, 3, 2, 2, None, None, "cached.com", "10.0.0.2"),
-            (now_ts - 30, 1, 1, 2, None, None, "ads.com", "10.0.0.1"),
-        ]
+        queries = [(now_ts + offset, *rest) for offset, *rest in _DEFAULT_QUERIES]
     cur.executemany(
         """
         INSERT INTO queries (
@@ -60,34 +93,37 @@ def create_ftl_db(
         queries,
     )
     conn.commit()
-    conn.close()
 
 
 def create_gravity_db(path: Path) -> None:
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("CREATE TABLE gravity (id INTEGER);")
-    cur.executemany("INSERT INTO gravity (id) VALUES (?);", [(1,), (2,), (3,), (4,)])
-    conn.commit()
-    conn.close()
+    with closing(sqlite3.connect(":memory:")) as conn:
+        cur = conn.cursor()
+        cur.execute("CREATE TABLE gravity (id INTEGER);")
+        cur.execute("INSERT INTO gravity (id) VALUES (1), (2), (3), (4);")
+        conn.commit()
+        _write_to(conn, path)
 
 
-def update_counters(path: Path, total: int, blocked: int) -> None:
+def connect_unsynced(path: Path) -> sqlite3.Connection:
+    # Throwaway test databases: durability does not matter, so skip the fsyncs.
     conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=MEMORY;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    return conn
+
+
+def update_counters(conn: sqlite3.Connection, total: int, blocked: int) -> None:
     cur = conn.cursor()
     cur.execute("UPDATE counters SET value = ? WHERE id = 0;", (total,))
     cur.execute("UPDATE counters SET value = ? WHERE id = 1;", (blocked,))
     conn.commit()
-    conn.close()
 
 
 def add_queries(
-    path: Path,
+    conn: sqlite3.Connection,
     queries: list[tuple[int, int, int, int | None, str | None, float | None, str, str]],
 ) -> None:
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.executemany(
+    conn.executemany(
         """
         INSERT INTO queries (
             timestamp, status, type, reply_type, forward, reply_time, domain, client
@@ -96,4 +132,20 @@ def add_queries(
         queries,
     )
     conn.commit()
-    conn.close()
+
+
+def configure_exporter(
+    mp: pytest.MonkeyPatch,
+    ftl_db: Path,
+    gravity_db: Path,
+    *,
+    top_n: int = 10,
+    lifetime: bool = False,
+) -> None:
+    mp.setattr(scraper.SETTINGS, "ftl_db_path", str(ftl_db))
+    mp.setattr(scraper.SETTINGS, "gravity_db_path", str(gravity_db))
+    mp.setattr(scraper.SETTINGS, "hostname_label", "test-host")
+    mp.setattr(scraper.SETTINGS, "exporter_tz", "UTC")
+    mp.setattr(scraper.SETTINGS, "top_n", top_n)
+    mp.setattr(scraper.SETTINGS, "enable_lifetime_dest_counters", lifetime)
+    metrics.METRICS.set_hostname_label("test-host")
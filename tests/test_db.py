@@ -1,14 +1,18 @@
+import sqlite3
+
 from pihole_sqlite_exporter import db
 
+_REAL_CONNECT = sqlite3.connect
+
 
 class TestSqliteRo:
     def test_sqlite_ro_quotes_path(self, monkeypatch) -> None:
         captured = {}
 
-        def _fake_connect(dsn, uri=True):
+        def _fake_connect(dsn, uri=True, **_kwargs):
             captured["dsn"] = dsn
             captured["uri"] = uri
-            return object()
+            return _REAL_CONNECT(":memory:")
 
         monkeypatch.setattr(db.sqlite3, "connect", _fake_connect)
         db.sqlite_ro("/tmp/my db.sqlite")
@@ -20,13 +24,25 @@ class TestSqliteRo:
         captured = {}
         dsn = "file:/tmp/test.db?mode=ro"
 
-        def _fake_connect(value, uri=True):
+        def _fake_connect(value, uri=True, **_kwargs):
             captured["dsn"] = value
             captured["uri"] = uri
-            return object()
+            return _REAL_CONNECT(":memory:")
 
         monkeypatch.setattr(db.sqlite3, "connect", _fake_connect)
         db.sqlite_ro(dsn)
 
         assert captured["dsn"] == dsn
         assert captured["uri"] is True
+
+    def test_sqlite_ro_applies_connection_pragmas(self, tmp_path) -> None:
+        path = tmp_path / "test.db"
+        _REAL_CONNECT(path).close()
+
+        conn = db.sqlite_ro(str(path))
+        try:
+            assert conn.execute("PRAGMA cache_size;").fetchone()[0] == -65536
+            assert conn.execute("PRAGMA temp_store;").fetchone()[0] == 2
+            assert conn.execute("PRAGMA query_only;").fetchone()[0] == 1
+        finally:
+            conn.close()
@@ -69,6 +69,73 @@ class TestExporterMain:
         assert called["serve"][0] == exporter.scraper.SETTINGS.listen_addr
         assert "Initial scrape failed" in caplog.text
 
+    def test_main_serves_unix_socket_when_configured(
+        self, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        called = {}
+
+        monkeypatch.setattr(exporter, "parse_args", lambda: SimpleNamespace(verbose=False))
+        monkeypatch.setattr(exporter, "configure_logging", lambda verbose: None)
+        monkeypatch.setattr(exporter, "scrape_and_update", lambda: None)
+        monkeypatch.setattr(exporter.scraper, "start_background_scrape", lambda **_: None)
+        monkeypatch.setattr(exporter.scraper.SETTINGS, "listen_socket_path", "/tmp/exporter.sock")
+        monkeypatch.setattr(
+            exporter.http_server,
+            "serve",
+            lambda addr, port, handler: called.setdefault("serve", (addr, port)),
+        )
+        monkeypatch.setattr(
+            exporter.http_server,
+            "serve_unix",
+            lambda path, handler: called.setdefault("serve_unix", path),
+        )
+
+        with caplog.at_level("INFO"):
+            exporter.main()
+
+        assert called == {"serve_unix": "/tmp/exporter.sock"}
+        assert "listen=unix:/tmp/exporter.sock," in caplog.text
+        assert "manage_indexes=False" in caplog.text
+
+    def test_main_stops_background_scrape_on_shutdown(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        called = {}
+
+        def _interrupt(addr, port, handler):
+            assert not called["stop_event"].is_set()
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr(exporter, "parse_args", lambda: SimpleNamespace(verbose=False))
+        monkeypatch.setattr(exporter, "configure_logging", lambda verbose: None)
+        monkeypatch.setattr(exporter, "scrape_and_update", lambda: None)
+        monkeypatch.setattr(
+            exporter.scraper,
+            "start_background_scrape",
+            lambda stop_event, **_: called.setdefault("stop_event", stop_event),
+        )
+        monkeypatch.setattr(exporter.http_server, "serve", _interrupt)
+
+        with pytest.raises(KeyboardInterrupt):
+            exporter.main()
+
+        assert called["stop_event"].is_set()
+
+    def test_main_ensures_indexes_when_enabled(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        called = []
+
+        monkeypatch.setattr(exporter, "parse_args", lambda: SimpleNamespace(verbose=False))
+        monkeypatch.setattr(exporter, "configure_logging", lambda verbose: None)
+        monkeypatch.setattr(exporter, "scrape_and_update", lambda: called.append("scrape"))
+        monkeypatch.setattr(exporter.scraper, "start_background_scrape", lambda **_: None)
+        monkeypatch.setattr(exporter.scraper.SETTINGS, "manage_indexes", True)
+        monkeypatch.setattr(exporter.scraper, "ensure_query_indexes", lambda: called.append("idx"))
+        monkeypatch.setattr(exporter.http_server, "serve", lambda addr, port, handler: None)
+
+        exporter.main()
+
+        assert called == ["idx", "scrape"]
+
 
 class TestReadVersion:
     def test_read_version_from_file(self, monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
@@ -1,20 +1,28 @@
+import pytest
+
 from pihole_sqlite_exporter import exporter
 from pihole_sqlite_exporter.metrics import MetricsSnapshot
 
 
-def test_health_status_ok(monkeypatch) -> None:
-    monkeypatch.setattr(exporter.scraper.SETTINGS, "scrape_interval", 10)
-    monkeypatch.setattr(
-        exporter.metrics.METRICS,
-        "get_snapshot",
-        lambda: MetricsSnapshot(payload=b"x", timestamp=100.0),
-    )
-    monkeypatch.setattr(
-        exporter.metrics.METRICS,
-        "get_scrape_status",
-        lambda: (1, 100.0, 100.0),
-    )
-    monkeypatch.setattr(exporter.time, "time", lambda: 115.0)
+@pytest.fixture
+def patch_health(monkeypatch):
+    def _apply(
+        status: tuple[int, float, float],
+        now: float = 0.0,
+        snapshot_ts: float = 100.0,
+        interval: int = 10,
+    ) -> None:
+        snapshot = MetricsSnapshot(payload=b"x", timestamp=snapshot_ts)
+        monkeypatch.setattr(exporter.scraper.SETTINGS, "scrape_interval", interval)
+        monkeypatch.setattr(exporter.metrics.METRICS, "get_snapshot", lambda: snapshot)
+        monkeypatch.setattr(exporter.metrics.METRICS, "get_scrape_status", lambda: status)
+        monkeypatch.setattr(exporter.time, "time", lambda: now)
+
+    return _apply
+
+
+def test_health_status_ok(patch_health) -> None:
+    patch_health((1, 100.0, 100.0), now=115.0)
 
     ok, msg = exporter._health_status()
 
@@ -22,19 +30,8 @@ def test_health_status_ok(monkeypatch) -> None:
     assert msg == "ok\n"
 
 
-def test_health_status_too_old(monkeypatch) -> None:
-    monkeypatch.setattr(exporter.scraper.SETTINGS, "scrape_interval", 10)
-    monkeypatch.setattr(
-        exporter.metrics.METRICS,
-        "get_snapshot",
-        lambda: MetricsSnapshot(payload=b"x", timestamp=100.0),
-    )
-    monkeypatch.setattr(
-        exporter.metrics.METRICS,
-        "get_scrape_status",
-        lambda: (1, 100.0, 100.0),
-    )
-    monkeypatch.setattr(exporter.time, "time", lambda: 121.0)
+def test_health_status_too_old(patch_health) -> None:
+    patch_health((1, 100.0, 100.0), now=121.0)
 
     ok, msg = exporter._health_status()
 
@@ -42,19 +39,8 @@ def test_health_status_too_old(monkeypatch) -> None:
     assert msg == "snapshot too old: 21s\n"
 
 
-def test_health_status_failed_scrape(monkeypatch) -> None:
-    monkeypatch.setattr(exporter.scraper.SETTINGS, "scrape_interval", 10)
-    monkeypatch.setattr(
-        exporter.metrics.METRICS,
-        "get_snapshot",
-        lambda: MetricsSnapshot(payload=b"x", timestamp=100.0),
-    )
-    monkeypatch.setattr(
-        exporter.metrics.METRICS,
-        "get_scrape_status",
-        lambda: (0, 100.0, 0.0),
-    )
-    monkeypatch.setattr(exporter.time, "time", lambda: 110.0)
+def test_health_status_failed_scrape(patch_health) -> None:
+    patch_health((0, 100.0, 0.0), now=110.0)
 
     ok, msg = exporter._health_status()
 
@@ -62,12 +48,8 @@ def test_health_status_failed_scrape(monkeypatch) -> None:
     assert msg == "last scrape failed\n"
 
 
-def test_ready_status_waiting(monkeypatch) -> None:
-    monkeypatch.setattr(
-        exporter.metrics.METRICS,
-        "get_scrape_status",
-        lambda: (0, 0.0, 0.0),
-    )
+def test_ready_status_waiting(patch_health) -> None:
+    patch_health((0, 0.0, 0.0))
 
     ok, msg = exporter._ready_status()
 
@@ -75,12 +57,8 @@ def test_ready_status_waiting(monkeypatch) -> None:
     assert msg == "waiting for first successful scrape\n"
 
 
-def test_ready_status_ok(monkeypatch) -> None:
-    monkeypatch.setattr(
-        exporter.metrics.METRICS,
-        "get_scrape_status",
-        lambda: (1, 120.0, 120.0),
-    )
+def test_ready_status_ok(patch_health) -> None:
+    patch_health((1, 120.0, 120.0))
 
     ok, msg = exporter._ready_status()
 
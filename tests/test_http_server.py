@@ -1,4 +1,11 @@
+import gzip
 import io
+import os
+import socket
+import stat
+import threading
+
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from pihole_sqlite_exporter import http_server
 from pihole_sqlite_exporter.metrics import MetricsSnapshot
@@ -19,48 +26,164 @@ HandlerCls = http_server.make_handler(
 )
 
 
-class DummyHandler(HandlerCls):
-    def __init__(self, path: str) -> None:
-        self.path = path
-        self.command = "GET"
-        self.sent_status = None
-        self.client_address = ("127.0.0.1", 12345)
-        self.headers = {"User-Agent": "pytest"}
-        self.wfile = io.BytesIO()
-
-    def send_response(self, code, message=None):
-        self.sent_status = code
+def _response(handler) -> tuple[int, dict[str, str], bytes]:
+    head, _, body = handler.wfile.getvalue().partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in header_lines)
+    return int(status_line.split()[1]), headers, body
 
-    def send_header(self, key, value):
-        return None
 
-    def end_headers(self):
-        return None
+def _handler(handler_cls=HandlerCls, path: str = "/metrics", headers: dict[str, str] | None = None):
+    # Bypasses BaseHTTPRequestHandler.__init__, which would try to read a request from a socket.
+    handler = handler_cls.__new__(handler_cls)
+    handler.path = path
+    handler.command = "GET"
+    handler.client_address = ("127.0.0.1", 12345)
+    handler.headers = {"User-Agent": "pytest"} if headers is None else headers
+    handler.wfile = io.BytesIO()
+    return handler
 
 
 class TestHandler:
     def test_handler_returns_200_for_metrics(self) -> None:
-        handler = DummyHandler("/metrics")
+        handler = _handler()
+        handler.do_GET()
+        status, headers, body = _response(handler)
+        assert status == 200
+        assert headers["Content-Type"] == CONTENT_TYPE_LATEST
+        assert headers["Content-Length"] == "2"
+        assert body == b"ok"
+
+    def test_handler_serves_metrics_on_root_path(self) -> None:
+        handler = _handler(path="/")
         handler.do_GET()
-        assert handler.sent_status == 200
-        assert handler.wfile.getvalue() == b"ok"
+        assert _response(handler)[2] == b"ok"
 
     def test_handler_returns_200_for_healthz(self) -> None:
-        handler = DummyHandler("/healthz")
+        handler = _handler(path="/healthz")
         handler.do_GET()
-        assert handler.sent_status == 200
-        assert handler.wfile.getvalue() == b"ok\n"
+        status, _headers, body = _response(handler)
+        assert status == 200
+        assert body == b"ok\n"
 
     def test_handler_returns_200_for_readyz(self) -> None:
-        handler = DummyHandler("/readyz")
+        handler = _handler(path="/readyz")
         handler.do_GET()
-        assert handler.sent_status == 200
-        assert handler.wfile.getvalue() == b"ready\n"
+        status, _headers, body = _response(handler)
+        assert status == 200
+        assert body == b"ready\n"
+
+    def test_handler_logs_request_details_at_debug(self, caplog) -> None:
+        handler = _handler()
+        with caplog.at_level("DEBUG", logger="pihole_sqlite_exporter"):
+            handler.do_GET()
+
+        assert "Metrics request from 127.0.0.1:12345 user_agent=pytest" in caplog.text
+        assert "HTTP 200 served metrics bytes=2" in caplog.text
+
+    def test_handler_skips_request_details_without_debug(self, caplog) -> None:
+        class CountingHeaders(dict):
+            lookups = 0
+
+            def get(self, key, default=None):
+                CountingHeaders.lookups += 1
+                return super().get(key, default)
+
+        handler = _handler()
+        handler.headers = CountingHeaders(handler.headers)
+        with caplog.at_level("INFO", logger="pihole_sqlite_exporter"):
+            handler.do_GET()
+
+        assert CountingHeaders.lookups == 0
+        assert _response(handler)[0] == 200
+
+    def test_handler_serves_gzip_when_accepted(self) -> None:
+        payload = b"pihole_up 1\n"
+        compressed = gzip.compress(payload)
+
+        HandlerWithGzip = http_server.make_handler(
+            lambda: MetricsSnapshot(payload=payload, timestamp=1.0, payload_gzip=compressed),
+            _health_ok,
+            _ready_ok,
+        )
+
+        plain = _handler(HandlerWithGzip, headers={"Accept-Encoding": "identity"})
+        plain.do_GET()
+        _status, headers, body = _response(plain)
+        assert "Content-Encoding" not in headers
+        assert headers["Vary"] == "Accept-Encoding"
+        assert body == payload
+
+        handler = _handler(HandlerWithGzip, headers={"Accept-Encoding": "gzip, deflate"})
+        handler.do_GET()
+        status, headers, body = _response(handler)
+        assert status == 200
+        assert headers["Content-Encoding"] == "gzip"
+        assert headers["Vary"] == "Accept-Encoding"
+        assert headers["Content-Length"] == str(len(compressed))
+        assert gzip.decompress(body) == payload
+
+    def test_handler_honours_accept_encoding_qvalues(self) -> None:
+        payload = b"pihole_up 1\n"
+        HandlerWithGzip = http_server.make_handler(
+            lambda: MetricsSnapshot(
+                payload=payload, timestamp=1.0, payload_gzip=gzip.compress(payload)
+            ),
+            _health_ok,
+            _ready_ok,
+        )
+
+        for accept_encoding, expected in [
+            ("gzip;q=0", ""),
+            ("deflate, GZIP ; q=0.0", ""),
+            ("gzip;q=0, *", ""),
+            ("gzip;q=0.5", "gzip"),
+            ("x-gzip", "gzip"),
+            ("*", "gzip"),
+            ("*;q=0", ""),
+            ("br", ""),
+        ]:
+            handler = _handler(HandlerWithGzip, headers={"Accept-Encoding": accept_encoding})
+            handler.do_GET()
+            _status, headers, _body = _response(handler)
+            assert headers.get("Content-Encoding", "") == expected, accept_encoding
+
+    def test_handler_returns_304_on_matching_etag(self) -> None:
+        payload = b"pihole_up 1\n"
+        snapshot = MetricsSnapshot(
+            payload=payload,
+            timestamp=1.0,
+            payload_gzip=gzip.compress(payload),
+            etag='"1.000000"',
+        )
+        HandlerWithEtag = http_server.make_handler(lambda: snapshot, _health_ok, _ready_ok)
+
+        fresh = _handler(HandlerWithEtag, headers={})
+        fresh.do_GET()
+        status, headers, body = _response(fresh)
+        assert (status, headers["ETag"], body) == (200, '"1.000000"', payload)
+
+        cached = _handler(HandlerWithEtag, headers={"If-None-Match": 'W/"0.5", "1.000000"'})
+        cached.do_GET()
+        status, headers, body = _response(cached)
+        assert (status, headers["ETag"], body) == (304, '"1.000000"', b"")
+        assert headers["Vary"] == "Accept-Encoding"
+
+        # The plain validator does not match the gzip representation.
+        gzipped = _handler(
+            HandlerWithEtag, headers={"Accept-Encoding": "gzip", "If-None-Match": '"1.000000"'}
+        )
+        gzipped.do_GET()
+        status, headers, _body = _response(gzipped)
+        assert (status, headers["ETag"]) == (200, '"1.000000-gzip"')
 
     def test_handler_returns_404_for_unknown_path(self) -> None:
-        handler = DummyHandler("/nope")
+        handler = _handler(path="/nope")
         handler.do_GET()
-        assert handler.sent_status == 404
+        status, headers, body = _response(handler)
+        assert status == 404
+        assert headers["Content-Length"] == "0"
+        assert body == b""
 
     def test_handler_returns_503_on_empty_snapshot(self) -> None:
         HandlerWithEmpty = http_server.make_handler(
@@ -69,27 +192,9 @@ class TestHandler:
             _ready_ok,
         )
 
-        class Handler(HandlerWithEmpty):
-            def __init__(self) -> None:
-                self.path = "/metrics"
-                self.command = "GET"
-                self.sent_status = None
-                self.client_address = ("127.0.0.1", 12345)
-                self.headers = {"User-Agent": "pytest"}
-                self.wfile = io.BytesIO()
-
-            def send_response(self, code, message=None):
-                self.sent_status = code
-
-            def send_header(self, key, value):
-                return None
-
-            def end_headers(self):
-                return None
-
-        handler = Handler()
+        handler = _handler(HandlerWithEmpty)
         handler.do_GET()
-        assert handler.sent_status == 503
+        assert _response(handler)[0] == 503
 
     def test_handler_returns_500_on_snapshot_failure(self) -> None:
         HandlerWithError = http_server.make_handler(
@@ -98,35 +203,120 @@ class TestHandler:
             _ready_ok,
         )
 
-        class Handler(HandlerWithError):
-            def __init__(self) -> None:
-                self.path = "/metrics"
-                self.command = "GET"
-                self.sent_status = None
-                self.client_address = ("127.0.0.1", 12345)
-                self.headers = {"User-Agent": "pytest"}
-                self.wfile = io.BytesIO()
-
-            def send_response(self, code, message=None):
-                self.sent_status = code
-
-            def send_header(self, key, value):
-                return None
-
-            def end_headers(self):
-                return None
-
-        handler = Handler()
+        handler = _handler(HandlerWithError)
         handler.do_GET()
-        assert handler.sent_status == 500
+        assert _response(handler)[0] == 500
 
     def test_handler_handles_broken_pipe(self) -> None:
-        handler = DummyHandler("/metrics")
+        handler = _handler()
 
         class BrokenWriter(io.BytesIO):
             def write(self, data):
+                self.attempted = data
                 raise BrokenPipeError("boom")
 
         handler.wfile = BrokenWriter()
         handler.do_GET()
-        assert handler.sent_status == 200
+        assert handler.wfile.attempted.startswith(b"HTTP/1.0 200 OK\r\n")
+
+
+class TestResponseTemplates:
+    def test_text_response_format(self) -> None:
+        assert http_server._text_response("HTTP/1.0", 200, "ok\n") == (
+            b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Length: 3\r\n",
+            b"ok\n",
+        )
+
+    def test_responses_carry_date_header(self, monkeypatch) -> None:
+        monkeypatch.setattr(http_server.time, "time", lambda: 784111777.5)
+        snapshot = MetricsSnapshot(payload=b"ok", timestamp=1.0, etag='"1.000000"')
+        handler_cls = http_server.make_handler(lambda: snapshot, _health_ok, _ready_ok)
+
+        for path, headers in [
+            ("/metrics", {}),
+            ("/metrics", {"If-None-Match": '"1.000000"'}),
+            ("/healthz", {}),
+            ("/missing", {}),
+        ]:
+            handler = _handler(handler_cls, path=path, headers=headers)
+            handler.do_GET()
+            _status, response_headers, _body = _response(handler)
+            assert response_headers["Date"] == "Sun, 06 Nov 1994 08:49:37 GMT", path
+
+        assert http_server._date_header(784111777) is http_server._date_header(784111777)
+
+    def test_dynamic_probe_messages_are_not_cached(self) -> None:
+        ages = iter(["snapshot too old: 21s\n", "snapshot too old: 22s\n"])
+        handler_cls = http_server.make_handler(
+            lambda: MetricsSnapshot(payload=b"ok", timestamp=1.0),
+            lambda: (False, next(ages)),
+            _ready_ok,
+        )
+
+        bodies = []
+        for _ in range(2):
+            handler = _handler(handler_cls, path="/healthz")
+            handler.do_GET()
+            bodies.append(_response(handler)[2])
+
+        assert bodies == [b"snapshot too old: 21s\n", b"snapshot too old: 22s\n"]
+        assert not hasattr(http_server._text_response, "cache_info")
+
+
+class TestTCPHTTPServer:
+    def test_accepted_connections_disable_nagle(self) -> None:
+        httpd = http_server.TCPHTTPServer(("127.0.0.1", 0), HandlerCls)
+        try:
+            with socket.create_connection(httpd.server_address):
+                conn, _addr = httpd.get_request()
+                with conn:
+                    assert conn.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY) != 0
+        finally:
+            httpd.server_close()
+
+    def test_handles_requests_in_threads(self) -> None:
+        assert issubclass(http_server.TCPHTTPServer, http_server.ThreadingHTTPServer)
+        assert http_server.TCPHTTPServer.daemon_threads is True
+
+
+class TestUnixHTTPServer:
+    def test_serves_metrics_over_unix_socket(self, tmp_path) -> None:
+        socket_path = str(tmp_path / "exporter.sock")
+        httpd = http_server.UnixHTTPServer(socket_path, HandlerCls)
+        try:
+            assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o660
+            worker = threading.Thread(target=httpd.handle_request)
+            worker.start()
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(socket_path)
+                client.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+                response = b"".join(iter(lambda: client.recv(4096), b""))
+            worker.join(timeout=5)
+        finally:
+            httpd.server_close()
+
+        assert response.startswith(b"HTTP/1.0 200 OK\r\n")
+        assert response.endswith(b"\r\n\r\nok")
+
+    def test_socket_is_created_without_world_access(self, tmp_path, monkeypatch) -> None:
+        socket_path = str(tmp_path / "exporter.sock")
+        # Skipping the chmod shows the mode the socket had at bind time.
+        monkeypatch.setattr(http_server.os, "chmod", lambda path, mode: None)
+        old_umask = os.umask(0)
+        try:
+            httpd = http_server.UnixHTTPServer(socket_path, HandlerCls)
+            httpd.server_close()
+            assert os.umask(0) == 0
+        finally:
+            os.umask(old_umask)
+
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) & 0o117 == 0
+
+    def test_replaces_stale_socket_file(self, tmp_path) -> None:
+        socket_path = str(tmp_path / "exporter.sock")
+        http_server.UnixHTTPServer(socket_path, HandlerCls).server_close()
+
+        httpd = http_server.UnixHTTPServer(socket_path, HandlerCls)
+        httpd.server_close()
+
+        assert stat.S_ISSOCK(os.stat(socket_path).st_mode)
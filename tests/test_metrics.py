@@ -0,0 +1,191 @@
+import gzip
+
+from prometheus_client import generate_latest
+from prometheus_client.parser import text_string_to_metric_families
+
+from pihole_sqlite_exporter.metrics import Metrics
+
+
+def _families(payload: bytes) -> list[tuple[str, str, str]]:
+    return [
+        (family.name, family.type, family.documentation)
+        for family in text_string_to_metric_families(payload.decode("utf-8"))
+    ]
+
+
+class TestRender:
+    def _populated(self) -> Metrics:
+        metrics = Metrics("test-host")
+        metrics.set_lifetime_totals(1234567, 89)
+        metrics.set_forward_destinations_lifetime({"1.1.1.1": 3, "cache": 2})
+        metrics.pihole_forward_destinations.labels("test-host", "1.1.1.1", "1.1.1.1").set(3)
+        metrics.pihole_ads_percentage_today.labels("test-host").set(100.0 / 3.0)
+        metrics.pihole_top_sources.labels("test-host", "10.0.0.1", "client-a").set(7)
+        metrics.pihole_scrape_today_skipped.labels("test-host").inc()
+        return metrics
+
+    def test_render_matches_generate_latest(self) -> None:
+        metrics = self._populated()
+
+        rendered = metrics.render()
+        expected = generate_latest(metrics.registry)
+
+        assert sorted(rendered.splitlines()) == sorted(expected.splitlines())
+        assert _families(rendered) == _families(expected)
+
+    def test_render_keeps_counter_and_gauge_of_same_stem_apart(self) -> None:
+        payload = self._populated().render().decode("utf-8")
+
+        assert payload.count("# TYPE pihole_forward_destinations gauge\n") == 1
+        assert payload.count("# TYPE pihole_forward_destinations_total counter\n") == 1
+
+    def test_render_emits_help_and_type_headers(self) -> None:
+        payload = Metrics("test-host").render().decode("utf-8")
+
+        assert "# TYPE pihole_dns_queries_total counter\n" in payload
+        assert "# TYPE pihole_ads_blocked_today gauge\n" in payload
+
+    def test_render_escapes_label_values(self) -> None:
+        metrics = Metrics("test-host")
+        metrics.pihole_top_queries.labels("test-host", 'bad"domain\\x\n').set(1)
+
+        payload = metrics.render().decode("utf-8")
+
+        assert 'domain="bad\\"domain\\\\x\\n"' in payload
+
+
+class TestTodaySkippedCounter:
+    def test_exported_as_counter_with_separate_created_gauge(self) -> None:
+        metrics = Metrics("test-host")
+        metrics.pihole_scrape_today_skipped.labels("test-host").inc(2)
+
+        families = {
+            family.name: family
+            for family in text_string_to_metric_families(metrics.render().decode("utf-8"))
+        }
+
+        counter = families["pihole_scrape_today_skipped"]
+        assert counter.type == "counter"
+        assert [(s.name, s.labels, s.value) for s in counter.samples] == [
+            ("pihole_scrape_today_skipped_total", {"hostname": "test-host"}, 2.0)
+        ]
+        created = families["pihole_scrape_today_skipped_created"]
+        assert created.type == "gauge"
+        assert [s.name for s in created.samples] == ["pihole_scrape_today_skipped_created"]
+
+
+class TestLifetimeCollector:
+    def _family(self, metrics: Metrics, name: str):
+        return next(family for family in metrics.registry.collect() if family.name == name)
+
+    def test_reuses_families_across_collects(self) -> None:
+        metrics = Metrics("test-host")
+        metrics.set_lifetime_totals(5, 1)
+        first = self._family(metrics, "pihole_dns_queries")
+
+        metrics.set_lifetime_totals(8, 2)
+        second = self._family(metrics, "pihole_dns_queries")
+
+        assert second is first
+        assert [sample.value for sample in second.samples] == [8.0]
+
+    def test_forward_destination_samples_follow_updates(self) -> None:
+        metrics = Metrics("test-host")
+        metrics.set_forward_destinations_lifetime({"1.1.1.1": 3})
+        metrics.set_forward_destinations_lifetime({"cache": 2, "1.1.1.1": 4})
+
+        family = self._family(metrics, "pihole_forward_destinations")
+
+        assert [(s.labels["destination"], s.value) for s in family.samples] == [
+            ("1.1.1.1", 4.0),
+            ("cache", 2.0),
+        ]
+
+    def test_forward_destination_samples_follow_hostname(self) -> None:
+        metrics = Metrics("test-host")
+        metrics.set_forward_destinations_lifetime({"1.1.1.1": 3})
+        metrics.set_hostname_label("other-host")
+
+        family = self._family(metrics, "pihole_forward_destinations")
+
+        assert [s.labels["hostname"] for s in family.samples] == ["other-host"]
+
+
+class TestHostChildren:
+    def test_children_are_resolved_once(self) -> None:
+        metrics = Metrics("test-host")
+        names = ("A", "AAAA")
+
+        first = metrics.host_children(metrics.pihole_querytypes, "test-host", names)
+        second = metrics.host_children(metrics.pihole_querytypes, "test-host", names)
+        first[1].set(3)
+
+        assert all(a is b for a, b in zip(first, second, strict=True))
+        assert metrics.pihole_querytypes.labels("test-host", "AAAA")._value.get() == 3.0
+
+    def test_host_child_is_resolved_once_per_host(self) -> None:
+        metrics = Metrics("test-host")
+
+        child = metrics.host_child(metrics.pihole_status, "test-host")
+
+        assert metrics.host_child(metrics.pihole_status, "test-host") is child
+        assert metrics.host_child(metrics.pihole_status, "other-host") is not child
+
+
+class TestDynamicChildren:
+    def test_children_are_reused_and_stale_labelsets_pruned(self) -> None:
+        metrics = Metrics("test-host")
+        gauge = metrics.pihole_top_ads
+
+        metrics.begin_dynamic_series()
+        kept = metrics.dynamic_child(gauge, "test-host", "kept.example")
+        metrics.dynamic_child(gauge, "test-host", "gone.example").set(1)
+        metrics.prune_dynamic_series()
+
+        metrics.begin_dynamic_series()
+        assert metrics.dynamic_child(gauge, "test-host", "kept.example") is kept
+        metrics.prune_dynamic_series()
+
+        family = self._family(metrics, "pihole_top_ads")
+        assert [s.labels["domain"] for s in family.samples] == ["kept.example"]
+
+    def _family(self, metrics: Metrics, name: str):
+        return next(family for family in metrics.registry.collect() if family.name == name)
+
+
+class TestScrapeStatus:
+    def test_failure_keeps_last_successful_timestamp(self) -> None:
+        metrics = Metrics("test-host")
+        metrics.record_scrape_result(True, timestamp=100.0)
+        metrics.record_scrape_result(False, timestamp=160.0)
+
+        assert metrics.get_scrape_status() == (0, 160.0, 100.0)
+
+    def test_snapshot_is_replaced_as_a_whole(self) -> None:
+        metrics = Metrics("test-host")
+        before = metrics.get_snapshot()
+        metrics.update_snapshot(b"payload", timestamp=42.0)
+
+        after = metrics.get_snapshot()
+        assert before.payload == b""
+        assert (after.payload, after.timestamp) == (b"payload", 42.0)
+
+    def test_snapshot_etag_changes_with_each_snapshot(self) -> None:
+        metrics = Metrics("test-host")
+        assert metrics.get_snapshot().etag == ""
+
+        metrics.update_snapshot(b"payload", timestamp=42.0)
+        first = metrics.get_snapshot()
+        metrics.update_snapshot(b"payload", timestamp=43.0)
+
+        assert (first.etag, first.etag_gzip) == ('"42.000000"', '"42.000000-gzip"')
+        assert metrics.get_snapshot().etag != first.etag
+
+    def test_snapshot_carries_deterministic_gzip_payload(self) -> None:
+        metrics = Metrics("test-host")
+        metrics.update_snapshot(b"payload", timestamp=42.0)
+        first = metrics.get_snapshot().payload_gzip
+        metrics.update_snapshot(b"payload", timestamp=43.0)
+
+        assert gzip.decompress(first) == b"payload"
+        assert metrics.get_snapshot().payload_gzip == first
@@ -1,6 +1,9 @@
+import os
+import sqlite3
 import time
 
 import pytest
+from fixtures import configure_exporter, create_ftl_db
 
 from pihole_sqlite_exporter import metrics, scraper
 
@@ -14,6 +17,11 @@ from pihole_sqlite_exporter import metrics, scraper
         ("pihole_queries_forwarded", 1.0),
         ("pihole_queries_cached", 1.0),
         ("pihole_domains_being_blocked", 4.0),
+        ("pihole_dns_queries_total", 5.0),
+        ("pihole_dns_queries_blocked_total", 1.0),
+        ("pihole_clients_ever_seen", 2.0),
+        ("pihole_unique_clients", 2.0),
+        ("pihole_unique_domains", 3.0),
     ],
 )
 def test_scrape_metrics(metric: str, expected, metrics_text: str, metric_value) -> None:
@@ -33,17 +41,52 @@ def test_scrape_falls_back_when_gravity_missing(
 ) -> None:
     ftl_path = ftl_db_factory(domain_count=2)
     gravity_path = tmp_path / "missing-gravity.db"
+    configure_exporter(monkeypatch, ftl_path, gravity_path)
+
+    scraper.scrape_and_update()
+    metrics_text = metrics.METRICS.get_snapshot().payload.decode("utf-8")
+    assert (
+        metric_value(metrics_text, "pihole_domains_being_blocked", {"hostname": "test-host"}) == 2.0
+    )
+
+
+def test_ftl_connection_reused_until_db_replaced(
+    ftl_db_factory, tmp_path, monkeypatch: pytest.MonkeyPatch, sqlite_ro_opens
+) -> None:
+    ftl_path = ftl_db_factory()
     monkeypatch.setattr(scraper.SETTINGS, "ftl_db_path", str(ftl_path))
-    monkeypatch.setattr(scraper.SETTINGS, "gravity_db_path", str(gravity_path))
-    monkeypatch.setattr(scraper.SETTINGS, "hostname_label", "test-host")
-    monkeypatch.setattr(scraper.SETTINGS, "exporter_tz", "UTC")
+    monkeypatch.setattr(scraper.SETTINGS, "gravity_db_path", str(tmp_path / "missing.db"))
     monkeypatch.setattr(scraper.SETTINGS, "enable_lifetime_dest_counters", False)
-    metrics.METRICS.set_hostname_label("test-host")
+
+    scraper.scrape_and_update()
+    scraper.scrape_and_update()
+    assert sqlite_ro_opens.count(str(ftl_path)) == 1
+
+    replacement = tmp_path / "replacement.db"
+    create_ftl_db(replacement)
+    os.replace(replacement, ftl_path)
+
+    scraper.scrape_and_update()
+    assert sqlite_ro_opens.count(str(ftl_path)) == 2
+
+
+def test_gravity_count_cached_until_db_changes(
+    exporter_config: None, gravity_db, sqlite_ro_opens, metric_value
+) -> None:
+    scraper.scrape_and_update()
+    scraper.scrape_and_update()
+    assert sqlite_ro_opens.count(str(gravity_db)) == 1
+
+    conn = sqlite3.connect(gravity_db)
+    conn.executemany("INSERT INTO gravity (id) VALUES (?);", [(5,), (6,)])
+    conn.commit()
+    conn.close()
 
     scraper.scrape_and_update()
     metrics_text = metrics.METRICS.get_snapshot().payload.decode("utf-8")
+    assert sqlite_ro_opens.count(str(gravity_db)) == 2
     assert (
-        metric_value(metrics_text, "pihole_domains_being_blocked", {"hostname": "test-host"}) == 2.0
+        metric_value(metrics_text, "pihole_domains_being_blocked", {"hostname": "test-host"}) == 6.0
     )
 
 
@@ -58,12 +101,7 @@ def test_lifetime_destinations_metric(
         (now_ts - 40, 1, 1, 2, None, None, "ads.com", "10.0.0.1"),
     ]
     ftl_path = ftl_db_factory(queries=queries)
-    monkeypatch.setattr(scraper.SETTINGS, "ftl_db_path", str(ftl_path))
-    monkeypatch.setattr(scraper.SETTINGS, "gravity_db_path", str(ftl_path))
-    monkeypatch.setattr(scraper.SETTINGS, "hostname_label", "test-host")
-    monkeypatch.setattr(scraper.SETTINGS, "exporter_tz", "UTC")
-    monkeypatch.setattr(scraper.SETTINGS, "enable_lifetime_dest_counters", True)
-    metrics.METRICS.set_hostname_label("test-host")
+    configure_exporter(monkeypatch, ftl_path, ftl_path, lifetime=True)
 
     scraper.scrape_and_update()
     metrics_text = metrics.METRICS.get_snapshot().payload.decode("utf-8")
@@ -75,3 +113,193 @@ def test_lifetime_destinations_metric(
         )
         == 2.0
     )
+
+
+def test_forward_destination_response_stats(
+    ftl_db_factory, monkeypatch: pytest.MonkeyPatch, metric_value
+) -> None:
+    now_ts = int(time.time())
+    queries = [
+        (now_ts - 10, 2, 1, 3, "1.1.1.1", 0.1, "example.com", "10.0.0.1"),
+        (now_ts - 20, 2, 1, 3, "1.1.1.1", 0.3, "example.com", "10.0.0.1"),
+        (now_ts - 30, 2, 1, 3, "1.1.1.1", None, "example.com", "10.0.0.1"),
+        (now_ts - 40, 2, 1, 3, "9.9.9.9", 0.2, "example.com", "10.0.0.2"),
+    ]
+    ftl_path = ftl_db_factory(queries=queries)
+    configure_exporter(monkeypatch, ftl_path, ftl_path)
+
+    scraper.scrape_and_update()
+    metrics_text = metrics.METRICS.get_snapshot().payload.decode("utf-8")
+
+    def _value(name: str, dest: str) -> float:
+        labels = {"hostname": "test-host", "destination": dest, "destination_name": dest}
+        return metric_value(metrics_text, name, labels)
+
+    assert _value("pihole_forward_destinations", "1.1.1.1") == 3.0
+    assert _value("pihole_forward_destinations_responsetime", "1.1.1.1") == pytest.approx(0.2)
+    assert _value("pihole_forward_destinations_responsevariance", "1.1.1.1") == pytest.approx(
+        scraper.variance([0.1, 0.3])
+    )
+    assert _value("pihole_forward_destinations_responsevariance", "9.9.9.9") == pytest.approx(
+        0.0, abs=1e-12
+    )
+
+
+@pytest.mark.parametrize(
+    ("metric", "label", "expected"),
+    [
+        ("pihole_querytypes", "A", 2.0),
+        ("pihole_querytypes", "AAAA", 1.0),
+        ("pihole_querytypes", "MX", 0.0),
+        ("pihole_reply", "cname", 1.0),
+        ("pihole_reply", "nx_domain", 2.0),
+        ("pihole_reply", "blob", 0.0),
+    ],
+)
+def test_type_histograms(
+    metric: str, label: str, expected: float, metrics_text: str, metric_value
+) -> None:
+    assert metric_value(metrics_text, metric, {"hostname": "test-host", "type": label}) == expected
+
+
+def test_snapshot_rendered_while_scrape_lock_held(
+    exporter_config: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    lock_states = []
+    render = metrics.METRICS.render
+
+    def _render() -> bytes:
+        lock_states.append(scraper._SCRAPE_LOCK.locked())
+        return render()
+
+    monkeypatch.setattr(metrics.METRICS, "render", _render)
+    scraper.scrape_and_update()
+
+    assert lock_states == [True]
+    assert not scraper._SCRAPE_LOCK.locked()
+
+
+@pytest.mark.parametrize(
+    ("client", "name", "expected"),
+    [
+        ("10.0.0.1", "client-a", 2.0),
+        ("10.0.0.2", "", 1.0),
+    ],
+)
+def test_top_sources_resolve_client_names(
+    client: str, name: str, expected: float, metrics_text: str, metric_value
+) -> None:
+    labels = {"hostname": "test-host", "source": client, "source_name": name}
+    assert metric_value(metrics_text, "pihole_top_sources", labels) == expected
+
+
+def test_top_sources_use_latest_name_of_multi_name_client(
+    ftl_db_factory, tmp_path, monkeypatch: pytest.MonkeyPatch, metric_value
+) -> None:
+    clients = [
+        ("10.0.0.1", "old-name"),
+        ("10.0.0.1", "new-name"),
+        ("10.0.0.1", ""),
+        ("10.0.0.2", ""),
+    ]
+    ftl_path = ftl_db_factory(clients=clients)
+    configure_exporter(monkeypatch, ftl_path, tmp_path / "missing-gravity.db")
+
+    scraper.scrape_and_update()
+    metrics_text = metrics.METRICS.get_snapshot().payload.decode("utf-8")
+
+    labels = {"source": "10.0.0.1", "source_name": "new-name"}
+    assert metric_value(metrics_text, "pihole_top_sources", labels) == 2.0
+    assert 'source_name="old-name"' not in metrics_text
+
+
+@pytest.mark.parametrize(
+    ("metric", "domain", "expected"),
+    [
+        ("pihole_top_ads", "ads.com", 1.0),
+        ("pihole_top_queries", "example.com", 1.0),
+        ("pihole_top_queries", "cached.com", 1.0),
+        ("pihole_top_queries", "ads.com", 1.0),
+    ],
+)
+def test_top_domain_lists(
+    metric: str, domain: str, expected: float, metrics_text: str, metric_value
+) -> None:
+    labels = {"hostname": "test-host", "domain": domain}
+    assert metric_value(metrics_text, metric, labels) == expected
+
+
+def test_top_lists_respect_top_n(
+    ftl_db_factory, monkeypatch: pytest.MonkeyPatch, metric_value
+) -> None:
+    now_ts = int(time.time())
+    queries = [
+        (now_ts - 10, 1, 1, 2, None, None, "ads.com", "10.0.0.1"),
+        (now_ts - 20, 1, 1, 2, None, None, "ads.com", "10.0.0.1"),
+        (now_ts - 30, 1, 1, 2, None, None, "tracker.com", "10.0.0.2"),
+    ]
+    ftl_path = ftl_db_factory(queries=queries)
+    configure_exporter(monkeypatch, ftl_path, ftl_path, top_n=1)
+
+    scraper.scrape_and_update()
+    metrics_text = metrics.METRICS.get_snapshot().payload.decode("utf-8")
+
+    assert metric_value(metrics_text, "pihole_top_ads", {"domain": "ads.com"}) == 2.0
+    assert 'domain="tracker.com"' not in metrics_text
+    assert metric_value(metrics_text, "pihole_top_sources", {"source": "10.0.0.1"}) == 2.0
+    assert 'source="10.0.0.2"' not in metrics_text
+
+
+def test_today_window_skipped_without_new_queries(
+    exporter_config: None, ftl_db, add_queries, metric_value
+) -> None:
+    def _scrape() -> str:
+        scraper.scrape_and_update()
+        return metrics.METRICS.get_snapshot().payload.decode("utf-8")
+
+    host = {"hostname": "test-host"}
+    skipped_before = metric_value(_scrape(), "pihole_scrape_today_skipped_total", host)
+
+    metrics_text = _scrape()
+    assert metric_value(metrics_text, "pihole_scrape_today_skipped_total", host) == (
+        skipped_before + 1
+    )
+    assert metric_value(metrics_text, "pihole_dns_queries_today", host) == 3.0
+    assert metric_value(metrics_text, "pihole_top_ads", {"domain": "ads.com"}) == 1.0
+
+    add_queries(ftl_db, [(int(time.time()), 1, 1, 2, None, None, "ads.com", "10.0.0.1")])
+    metrics_text = _scrape()
+    assert metric_value(metrics_text, "pihole_scrape_today_skipped_total", host) == (
+        skipped_before + 1
+    )
+    assert metric_value(metrics_text, "pihole_top_ads", {"domain": "ads.com"}) == 2.0
+
+
+def test_lifetime_destinations_count_only_new_rows(
+    exporter_config: None,
+    ftl_db,
+    db_writer,
+    add_queries,
+    monkeypatch: pytest.MonkeyPatch,
+    metric_value,
+) -> None:
+    monkeypatch.setattr(scraper.SETTINGS, "enable_lifetime_dest_counters", True)
+    monkeypatch.setattr(scraper.SETTINGS, "lifetime_dest_cache_seconds", 0)
+    labels = {"destination": "1.1.1.1"}
+
+    scraper.scrape_and_update()
+    metrics_text = metrics.METRICS.get_snapshot().payload.decode("utf-8")
+    assert metric_value(metrics_text, "pihole_forward_destinations_total", labels) == 1.0
+
+    conn = db_writer(ftl_db)
+    conn.execute("DELETE FROM queries WHERE forward = '1.1.1.1';")
+    conn.commit()
+    add_queries(ftl_db, [(int(time.time()), 2, 1, 3, "1.1.1.1", 0.1, "new.com", "10.0.0.1")])
+
+    scraper.scrape_and_update()
+    metrics_text = metrics.METRICS.get_snapshot().payload.decode("utf-8")
+    assert metric_value(metrics_text, "pihole_forward_destinations_total", labels) == 2.0
+    assert (
+        metric_value(metrics_text, "pihole_forward_destinations_total", {"destination": "cache"})
+        == 1.0
+    )
@@ -1,3 +1,9 @@
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
 import pytest
 
 from pihole_sqlite_exporter import metrics, scraper
@@ -15,11 +21,41 @@ def test_variance_simple_series() -> None:
     assert scraper.variance([1, 2, 3]) == pytest.approx(2.0 / 3.0)
 
 
+def test_variance_accepts_generator() -> None:
+    assert scraper.variance(x / 10 for x in range(1, 4)) == pytest.approx(2.0 / 300.0)
+
+
 def test_get_tz_falls_back_on_invalid(monkeypatch: pytest.MonkeyPatch) -> None:
     monkeypatch.setattr(scraper.SETTINGS, "exporter_tz", "Invalid/Timezone")
     assert scraper.get_tz() is not None
 
 
+def test_get_tz_fallback_is_not_memoized(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(scraper.SETTINGS, "exporter_tz", "Invalid/Timezone")
+    offsets = iter([timezone(timedelta(hours=1)), timezone(timedelta(hours=2))])
+    monkeypatch.setattr(scraper, "_local_tz", lambda: next(offsets))
+
+    assert scraper.get_tz() == timezone(timedelta(hours=1))
+    assert scraper.get_tz() == timezone(timedelta(hours=2))
+
+
+def test_get_tz_is_cached_per_name(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(scraper.SETTINGS, "exporter_tz", "Europe/Amsterdam")
+    assert scraper.get_tz() is scraper.get_tz()
+    assert scraper.get_tz() == ZoneInfo("Europe/Amsterdam")
+
+
+@pytest.mark.parametrize("tz_name", ["UTC", "Europe/Amsterdam", "America/Los_Angeles"])
+def test_start_of_day_ts_matches_local_midnight(
+    tz_name: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(scraper.SETTINGS, "exporter_tz", tz_name)
+    now = datetime.now(tz=ZoneInfo(tz_name))
+    expected = int(now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+    assert scraper.start_of_day_ts() == expected
+
+
 def test_scrape_skipped_when_lock_held(
     monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
 ) -> None:
@@ -33,3 +69,133 @@ def test_scrape_skipped_when_lock_held(
         assert "Scrape skipped" in caplog.text
     finally:
         scraper._SCRAPE_LOCK.release()
+
+
+class _StopAfter:
+    def __init__(self, scrapes: int) -> None:
+        self.remaining = scrapes
+
+    def is_set(self) -> bool:
+        return self.remaining <= 0
+
+
+def _run_scrape_loop(monkeypatch: pytest.MonkeyPatch, scrape_durations: list[float]) -> list[float]:
+    clock = {"now": 100.0}
+    sleeps: list[float] = []
+    stop_event = _StopAfter(len(scrape_durations))
+    durations = iter(scrape_durations)
+
+    def _fake_scrape() -> None:
+        clock["now"] += next(durations)
+        stop_event.remaining -= 1
+
+    def _fake_sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr(scraper.SETTINGS, "scrape_interval", 10)
+    monkeypatch.setattr(scraper, "scrape_and_update", _fake_scrape)
+    scraper._scrape_loop(stop_event=stop_event, sleep_fn=_fake_sleep, time_fn=lambda: clock["now"])
+    return sleeps
+
+
+def test_scrape_loop_keeps_fixed_cadence(monkeypatch: pytest.MonkeyPatch) -> None:
+    sleeps = _run_scrape_loop(monkeypatch, [2.0, 3.5, 0.5])
+
+    assert sleeps == [8.0, 6.5, 9.5]
+
+
+def test_scrape_loop_resets_schedule_after_overrun(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    with caplog.at_level(logging.WARNING, logger=scraper.logger.name):
+        sleeps = _run_scrape_loop(monkeypatch, [25.0, 1.0])
+
+    assert sleeps == [10.0, 9.0]
+    assert [r.message for r in caplog.records if "overran" in r.message] == [
+        "Scrape overran SCRAPE_INTERVAL=10s by 15.0s; rescheduling"
+    ]
+
+
+def test_scrape_loop_stops_during_sleep(monkeypatch: pytest.MonkeyPatch) -> None:
+    stop_event = threading.Event()
+    monkeypatch.setattr(scraper.SETTINGS, "scrape_interval", 3600)
+    monkeypatch.setattr(scraper, "scrape_and_update", stop_event.set)
+
+    thread = threading.Thread(target=scraper._scrape_loop, kwargs={"stop_event": stop_event})
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+
+
+def test_histogram_ignores_unknown_and_null_keys() -> None:
+    rows = [(1, 5), (3, 2), (None, 4), (99, 7)]
+
+    assert scraper._histogram(rows, 4) == [0, 5, 0, 2]
+
+
+def test_histogram_sums_repeated_keys() -> None:
+    assert scraper._histogram([(1, 2), (2, 1), (1, 3)], 3) == [0, 5, 1]
+
+
+def test_today_summary_empty_window(ftl_db) -> None:
+    with scraper.sqlite_ro(str(ftl_db)) as conn:
+        summary = scraper._load_today_summary(conn.cursor(), 2**31)
+    assert summary == scraper.TodaySummary(queries=0, blocked=0, forwarded=0, cached=0)
+
+
+def _index_names(path) -> set[str]:
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index';").fetchall()
+    finally:
+        conn.close()
+    return {name for (name,) in rows}
+
+
+def test_ensure_query_indexes_on_queries_table(ftl_db, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(scraper.SETTINGS, "ftl_db_path", str(ftl_db))
+
+    assert scraper.ensure_query_indexes() is True
+    assert scraper.ensure_query_indexes() is True
+    assert "idx_exporter_ts_status_fwd_rt" in _index_names(ftl_db)
+
+
+def test_ensure_query_indexes_targets_storage_behind_view(
+    tmp_path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "pihole-FTL.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE query_storage (id INTEGER PRIMARY KEY, timestamp INTEGER, "
+        "status INTEGER, forward INTEGER, reply_time REAL);"
+    )
+    conn.execute("CREATE VIEW queries AS SELECT * FROM query_storage;")
+    conn.close()
+    monkeypatch.setattr(scraper.SETTINGS, "ftl_db_path", str(path))
+
+    assert scraper.ensure_query_indexes() is True
+    assert "idx_exporter_ts_status_fwd_rt" in _index_names(path)
+
+
+def test_ensure_query_indexes_skips_missing_db(
+    tmp_path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    path = tmp_path / "pihole-FTL.db"
+    monkeypatch.setattr(scraper.SETTINGS, "ftl_db_path", str(path))
+
+    assert scraper.ensure_query_indexes() is False
+    assert not path.exists()
+    assert "does not exist; skipping query indexes" in caplog.text
+
+
+def test_ensure_query_indexes_logs_failure(
+    tmp_path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    path = tmp_path / "pihole-FTL.db"
+    path.write_bytes(b"not a database")
+    monkeypatch.setattr(scraper.SETTINGS, "ftl_db_path", str(path))
+
+    assert scraper.ensure_query_indexes() is False
+    assert "Could not create query indexes" in caplog.text
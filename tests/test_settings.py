@@ -10,12 +10,14 @@ class TestSettings:
             "GRAVITY_DB_PATH": "/tmp/gravity.db",
             "LISTEN_ADDR": "127.0.0.1",
             "LISTEN_PORT": "1234",
+            "LISTEN_SOCKET_PATH": "/run/exporter.sock",
             "HOSTNAME_LABEL": "test-host",
             "TOP_N": "5",
             "SCRAPE_INTERVAL": "10",
             "EXPORTER_TZ": "UTC",
             "ENABLE_LIFETIME_DEST_COUNTERS": "false",
             "LIFETIME_DEST_CACHE_SECONDS": "300",
+            "MANAGE_INDEXES": "true",
         }
 
         settings = Settings.from_env(env)
@@ -24,12 +26,20 @@ class TestSettings:
         assert settings.gravity_db_path == "/tmp/gravity.db"
         assert settings.listen_addr == "127.0.0.1"
         assert settings.listen_port == 1234
+        assert settings.listen_socket_path == "/run/exporter.sock"
         assert settings.hostname_label == "test-host"
         assert settings.top_n == 5
         assert settings.scrape_interval == 10
         assert settings.exporter_tz == "UTC"
         assert settings.enable_lifetime_dest_counters is False
         assert settings.lifetime_dest_cache_seconds == 300
+        assert settings.manage_indexes is True
+
+    def test_settings_listen_socket_path_defaults_to_tcp(self) -> None:
+        assert Settings.from_env({}).listen_socket_path == ""
+
+    def test_settings_manage_indexes_defaults_off(self) -> None:
+        assert Settings.from_env({}).manage_indexes is False
 
     @pytest.mark.parametrize(
         ("env", "error"),